@@ -1,17 +1,38 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional, Set
+from sqlalchemy.orm import Session, load_only
+from collections import deque
+from datetime import datetime
+from types import MappingProxyType
+import asyncio
+import itertools
 import json
-import uuid
+import os
+import re
 
-from models import Product, Order, ConversationSession, ConversationMessage
+import numpy as np
+
+from database import SessionLocal
+from models import Product, Order, ConversationSession, ConversationMessage, is_valid_session_id
 from schemas import (
     ProductResponse, Intent, ExtractedEntities,
-    AgentChatResponse, ToolResult
+    AgentChatResponse, ToolResult, product_list_adapter
 )
-from groq_service import GroqLLMService
+from cache_service import LRUCache, SemanticCache
+from config import get_settings
+from groq_service import GroqLLMService, GENERATION_ERROR_MESSAGE
 from pinecone_service import PineconeService, SearchResult
 
+# Tool call IDs only correlate a call with its result; a per-process counter is enough
+_CALL_ID_PREFIX = f"{os.getpid():x}"
+_call_id_counter = itertools.count()
+
+# Cheap signal that a message is a product search, worth prefetching results for
+PRODUCT_SEARCH_HINT_PATTERN = re.compile(
+    r"\b(show|find|search|looking|buy|need|want|recommend|suggest|cheap|cheapest|best|under|below|deals?)\b",
+    re.IGNORECASE
+)
+
 
 class ToolDefinition(BaseModel):
     """Definition of an agent tool."""
@@ -39,7 +60,8 @@ class ConversationContext(BaseModel):
 class AgentToolkit:
     """Define tools available to the shopping agent."""
 
-    TOOLS = [
+    # Tuple so the shared schema cannot be mutated by a caller
+    TOOLS = (
         {
             "type": "function",
             "function": {
@@ -148,8 +170,11 @@ class AgentToolkit:
                     "properties": {}
                 }
             }
-        }
-    ]
+        },
+    )
+
+    # Serialized once at class load; identifies the schema in LLM cache keys
+    TOOLS_JSON = json.dumps(TOOLS, sort_keys=True, separators=(",", ":"))
 
 
 class ShopAgent:
@@ -178,10 +203,46 @@ Guidelines:
 
 You have access to tools - use them when needed to provide accurate, up-to-date information."""
 
+    SUMMARY_PROMPT = """You maintain the memory of a shopping assistant conversation.
+
+Summarize the conversation transcript you are given in a few sentences. Keep the customer's
+stated needs, preferences, budget, products discussed, and any order IDs. If a previous summary
+is included, merge it into the new one. Respond only with the summary."""
+
+    MAX_SUGGESTIONS = 5
+    HISTORY_LIMIT = 20
+
+    _BROWSE_FOLLOW_UPS = (
+        "Would you like me to filter by price range?",
+        "Should I show more options?",
+        "Want details about any of these products?"
+    )
+    FOLLOW_UP_MAP = MappingProxyType({
+        Intent.PRODUCT_SEARCH: _BROWSE_FOLLOW_UPS,
+        Intent.PRODUCT_RECOMMENDATION: _BROWSE_FOLLOW_UPS,
+        Intent.PRODUCT_DETAILS: (
+            "Would you like to see similar products?",
+            "Any questions about this product?"
+        )
+    })
+
+    # Tool-free intents whose answers can be reused for near-duplicate prompts
+    SEMANTIC_CACHE_INTENTS = (Intent.GREETING, Intent.FAREWELL, Intent.GENERAL_QUESTION)
+
     def __init__(self, pinecone_service: Optional[PineconeService] = None):
+        settings = get_settings()
         self.llm_service = GroqLLMService()
         self.pinecone_service = pinecone_service or PineconeService()
         self.toolkit = AgentToolkit()
+        self.semantic_cache = SemanticCache(
+            dimension=settings.embedding_dimension,
+            threshold=settings.semantic_cache_threshold,
+            maxsize=settings.semantic_cache_size
+        )
+        # session_id -> deque of the most recent {"role", "content"} messages
+        self.history_cache = LRUCache(maxsize=settings.history_cache_sessions)
+        self.history_token_budget = settings.history_token_budget
+        self._summary_tasks: Dict[str, asyncio.Task] = {}
 
     def _search_result_to_dict(self, result: SearchResult) -> Dict[str, Any]:
         """Convert SearchResult to serializable dictionary."""
@@ -189,6 +250,75 @@ You have access to tools - use them when needed to provide accurate, up-to-date
         product_dict["similarity"] = result.similarity
         return product_dict
 
+    def _get_products_by_ids(self, db: Session, product_ids: List[int]) -> List[Product]:
+        """Load products with a single IN query, preserving the order of product_ids."""
+        if not product_ids:
+            return []
+
+        products = db.query(Product).filter(Product.id.in_(product_ids)).all()
+        products_by_id = {product.id: product for product in products}
+        return [products_by_id[pid] for pid in product_ids if pid in products_by_id]
+
+    async def _run_query(self, query_fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run a blocking query helper on a worker thread.
+
+        Each call gets its own short-lived session because tool calls run
+        concurrently and the request session must not be shared across threads.
+        Helpers return plain data so nothing outlives the session.
+        """
+        def run():
+            db = SessionLocal()
+            try:
+                return query_fn(db, *args)
+            finally:
+                db.close()
+
+        return await asyncio.to_thread(run)
+
+    @staticmethod
+    def _fetch_product_details(db: Session, product_id: int) -> Optional[Dict[str, Any]]:
+        """Load an active product as a serializable dictionary."""
+        product = db.query(Product).filter(
+            Product.id == product_id,
+            Product.is_active == True
+        ).first()
+        return ProductResponse.model_validate(product).model_dump() if product else None
+
+    @staticmethod
+    def _fetch_default_products(db: Session, limit: int) -> List[ProductResponse]:
+        """Load the first active products as fallback recommendations."""
+        products = db.query(Product).filter(
+            Product.is_active == True
+        ).limit(limit).all()
+        return product_list_adapter.validate_python(products, from_attributes=True)
+
+    @staticmethod
+    def _fetch_order_status(db: Session, order_id: int) -> Optional[Dict[str, Any]]:
+        """Load the status summary of an order."""
+        order = db.query(Order).filter(Order.id == order_id).first()
+        if not order:
+            return None
+
+        return {
+            "order_id": order.id,
+            "status": order.status,
+            "total_amount": float(order.total_amount),
+            "created_at": order.created_at.isoformat(),
+            "shipping_address": order.shipping_address
+        }
+
+    @staticmethod
+    def _fetch_user_orders(db: Session, user_id: int) -> List[Dict[str, Any]]:
+        """Load summaries of all orders belonging to a user."""
+        orders = db.query(Order).filter(Order.user_id == user_id).all()
+        return [{
+            "order_id": o.id,
+            "status": o.status,
+            "total_amount": float(o.total_amount),
+            "created_at": o.created_at.isoformat()
+        } for o in orders]
+
     async def execute_tool(
         self,
         tool_name: str,
@@ -197,7 +327,7 @@ You have access to tools - use them when needed to provide accurate, up-to-date
         user_id: Optional[int] = None
     ) -> ToolResult:
         """Execute a tool and return the result."""
-        call_id = str(uuid.uuid4())[:8]
+        call_id = f"{_CALL_ID_PREFIX}-{next(_call_id_counter):x}"
 
         try:
             if tool_name == "search_products":
@@ -221,26 +351,25 @@ You have access to tools - use them when needed to provide accurate, up-to-date
             elif tool_name == "get_product_details":
                 product = None
                 if arguments.get("product_id"):
-                    product = db.query(Product).filter(
-                        Product.id == arguments["product_id"],
-                        Product.is_active == True
-                    ).first()
+                    product = await self._run_query(
+                        self._fetch_product_details, arguments["product_id"]
+                    )
                 elif arguments.get("product_name"):
                     results = await self.pinecone_service.search(
                         query=arguments["product_name"],
                         db=db,
-                        top_k=1
+                        top_k=1,
+                        hydrate_from_db=True
                     )
                     if results:
-                        product = db.query(Product).filter(
-                            Product.id == results[0].product.id
-                        ).first()
+                        # Details report current stock, so the search loads the row from the database
+                        product = results[0].product.model_dump()
 
                 if product:
                     return ToolResult(
                         call_id=call_id,
                         tool_name=tool_name,
-                        result=ProductResponse.model_validate(product).model_dump(),
+                        result=product,
                         success=True
                     )
                 else:
@@ -269,16 +398,8 @@ You have access to tools - use them when needed to provide accurate, up-to-date
                         category_filter=arguments.get("category")
                     )
                 else:
-                    products = db.query(Product).filter(
-                        Product.is_active == True
-                    ).limit(5).all()
-                    results = [
-                        SearchResult(
-                            product=ProductResponse.model_validate(p),
-                            similarity=1.0
-                        )
-                        for p in products
-                    ]
+                    products = await self._run_query(self._fetch_default_products, 5)
+                    results = [SearchResult(product=p, similarity=1.0) for p in products]
 
                 serializable_results = [self._search_result_to_dict(r) for r in results]
 
@@ -290,21 +411,15 @@ You have access to tools - use them when needed to provide accurate, up-to-date
                 )
 
             elif tool_name == "check_order_status":
-                order = db.query(Order).filter(
-                    Order.id == arguments["order_id"]
-                ).first()
+                order = await self._run_query(
+                    self._fetch_order_status, arguments["order_id"]
+                )
 
                 if order:
                     return ToolResult(
                         call_id=call_id,
                         tool_name=tool_name,
-                        result={
-                            "order_id": order.id,
-                            "status": order.status,
-                            "total_amount": float(order.total_amount),
-                            "created_at": order.created_at.isoformat(),
-                            "shipping_address": order.shipping_address
-                        },
+                        result=order,
                         success=True
                     )
                 else:
@@ -326,16 +441,11 @@ You have access to tools - use them when needed to provide accurate, up-to-date
                         error_message="Please log in to view your orders"
                     )
 
-                orders = db.query(Order).filter(Order.user_id == user_id).all()
+                orders = await self._run_query(self._fetch_user_orders, user_id)
                 return ToolResult(
                     call_id=call_id,
                     tool_name=tool_name,
-                    result=[{
-                        "order_id": o.id,
-                        "status": o.status,
-                        "total_amount": float(o.total_amount),
-                        "created_at": o.created_at.isoformat()
-                    } for o in orders],
+                    result=orders,
                     success=True
                 )
 
@@ -364,7 +474,8 @@ You have access to tools - use them when needed to provide accurate, up-to-date
         user_id: Optional[int]
     ) -> ConversationSession:
         """Get existing session or create a new one."""
-        if session_id:
+        # Malformed IDs cannot match a session and would be rejected by a UUID column
+        if session_id and is_valid_session_id(session_id):
             session = db.query(ConversationSession).filter(
                 ConversationSession.id == session_id,
                 ConversationSession.is_active == True
@@ -379,11 +490,13 @@ You have access to tools - use them when needed to provide accurate, up-to-date
         db.add(session)
         db.commit()
         db.refresh(session)
+
+        # A new session has no messages, so seed its history instead of querying for it
+        self.history_cache.set(session.id, deque(maxlen=self.HISTORY_LIMIT))
         return session
 
-    async def _save_message(
+    def _build_message(
         self,
-        db: Session,
         session_id: str,
         role: str,
         content: str,
@@ -392,54 +505,198 @@ You have access to tools - use them when needed to provide accurate, up-to-date
         tool_calls: Optional[List[str]] = None,
         tool_results: Optional[List[Dict[str, Any]]] = None
     ) -> ConversationMessage:
-        """Save a message to conversation history."""
-        message = ConversationMessage(
+        """Build a conversation message without persisting it."""
+        return ConversationMessage(
             session_id=session_id,
             role=role,
             content=content,
             intent=intent,
-            entities=json.dumps(entities) if entities else None,
-            tool_calls=json.dumps(tool_calls) if tool_calls else None,
-            tool_results=json.dumps(tool_results) if tool_results else None
+            entities=entities or None,
+            tool_calls=tool_calls or None,
+            tool_results=tool_results or None,
+            # Stamped at build time so a turn's messages keep their order when flushed together
+            created_at=datetime.utcnow()
         )
-        db.add(message)
-        db.commit()
-        db.refresh(message)
-        return message
 
-    async def _get_conversation_history(
+    async def _save_messages(
         self,
         db: Session,
         session_id: str,
-        limit: int = 20
+        messages: List[ConversationMessage]
+    ) -> None:
+        """Persist a turn's messages to conversation history in one commit."""
+        db.add_all(messages)
+        try:
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        history = self.history_cache.get(session_id)
+        if history is not None:
+            history.extend({"role": m.role, "content": m.content} for m in messages)
+            if self._estimate_tokens(history) > self.history_token_budget:
+                self._schedule_summary(session_id, len(history) // 2)
+
+    @staticmethod
+    def _estimate_tokens(messages) -> int:
+        """Rough token count for a sequence of messages (~4 characters per token)."""
+        return sum(len(m["content"]) for m in messages) // 4
+
+    def _schedule_summary(self, session_id: str, message_count: int) -> None:
+        """Summarize the oldest messages of a session in the background."""
+        if message_count <= 0 or session_id in self._summary_tasks:
+            return
+
+        task = asyncio.create_task(self._summarize_session(session_id, message_count))
+        self._summary_tasks[session_id] = task
+        task.add_done_callback(lambda _: self._summary_tasks.pop(session_id, None))
+
+    async def _summarize_session(self, session_id: str, message_count: int) -> None:
+        """
+        Fold the oldest unsummarized messages into ConversationSession.summary.
+
+        Runs outside the request, so it uses its own database session.
+        """
+        db = SessionLocal()
+        try:
+            session = db.get(ConversationSession, session_id)
+            if not session:
+                return
+
+            query = db.query(ConversationMessage).filter(
+                ConversationMessage.session_id == session_id
+            )
+            if session.summary_until:
+                query = query.filter(ConversationMessage.created_at > session.summary_until)
+            messages = query.order_by(ConversationMessage.created_at).limit(message_count).all()
+            if not messages:
+                return
+
+            transcript = "\n".join(f"{m.role}: {m.content}" for m in messages)
+            if session.summary:
+                transcript = f"Previous summary: {session.summary}\n\n{transcript}"
+
+            summary = await self.llm_service.generate_response(
+                message=transcript,
+                system_prompt=self.SUMMARY_PROMPT
+            )
+            if summary == GENERATION_ERROR_MESSAGE:
+                return
+
+            session.summary = summary
+            session.summary_until = messages[-1].created_at
+            db.commit()
+
+            # Reload the window on the next turn so it starts after summary_until
+            self.history_cache.pop(session_id)
+        except Exception:
+            db.rollback()
+        finally:
+            db.close()
+
+    async def _get_conversation_history(
+        self,
+        db: Session,
+        session: ConversationSession,
+        limit: int = HISTORY_LIMIT
     ) -> List[Dict[str, str]]:
-        """Get conversation history for context."""
-        messages = db.query(ConversationMessage).filter(
-            ConversationMessage.session_id == session_id
-        ).order_by(ConversationMessage.created_at.desc()).limit(limit).all()
+        """
+        Get conversation history for context.
+
+        Messages already folded into the session summary are replaced by a
+        single leading system message holding that summary.
+        """
+        history = self.history_cache.get(session.id)
+        if history is None:
+            query = db.query(ConversationMessage).options(
+                load_only(
+                    ConversationMessage.role,
+                    ConversationMessage.content,
+                    ConversationMessage.created_at
+                )
+            ).filter(
+                ConversationMessage.session_id == session.id
+            )
+            if session.summary_until:
+                query = query.filter(ConversationMessage.created_at > session.summary_until)
+            messages = query.order_by(ConversationMessage.created_at.desc()).limit(limit).all()
+
+            messages = list(reversed(messages))
+            history = deque(
+                ({"role": m.role, "content": m.content} for m in messages),
+                maxlen=limit
+            )
+            self.history_cache.set(session.id, history)
 
-        messages = list(reversed(messages))
-        return [{"role": m.role, "content": m.content} for m in messages]
+        recent = list(history)[-limit:]
+        if session.summary:
+            return [{
+                "role": "system",
+                "content": f"Summary of the earlier conversation: {session.summary}"
+            }] + recent
+        return recent
 
     def _get_follow_up_questions(self, intent: Intent) -> Optional[List[str]]:
         """Get contextual follow-up questions based on intent."""
-        follow_up_map = {
-            Intent.PRODUCT_SEARCH: [
-                "Would you like me to filter by price range?",
-                "Should I show more options?",
-                "Want details about any of these products?"
-            ],
-            Intent.PRODUCT_RECOMMENDATION: [
-                "Would you like me to filter by price range?",
-                "Should I show more options?",
-                "Want details about any of these products?"
-            ],
-            Intent.PRODUCT_DETAILS: [
-                "Would you like to see similar products?",
-                "Any questions about this product?"
-            ]
-        }
-        return follow_up_map.get(intent)
+        questions = self.FOLLOW_UP_MAP.get(intent)
+        return list(questions) if questions else None
+
+    async def _generate_response(
+        self,
+        message: str,
+        history: List[Dict[str, str]],
+        tool_results: Optional[List[Dict[str, Any]]] = None,
+        token_queue: Optional[asyncio.Queue] = None
+    ) -> str:
+        """Generate the final reply, streaming its tokens into token_queue when given."""
+        if token_queue is None:
+            return await self.llm_service.generate_response(
+                message=message,
+                system_prompt=self.SYSTEM_PROMPT,
+                conversation_history=history,
+                tool_results=tool_results
+            )
+
+        parts: List[str] = []
+        async for token in self.llm_service.stream_response(
+            message=message,
+            system_prompt=self.SYSTEM_PROMPT,
+            conversation_history=history,
+            tool_results=tool_results
+        ):
+            parts.append(token)
+            token_queue.put_nowait(token)
+        return "".join(parts)
+
+    async def _generate_cached_response(
+        self,
+        message: str,
+        history: List[Dict[str, str]],
+        intent: Intent,
+        user_id: Optional[int],
+        message_embedding: Optional[np.ndarray] = None,
+        token_queue: Optional[asyncio.Queue] = None
+    ) -> str:
+        """Generate a tool-free response, reusing answers to near-duplicate prompts."""
+        # Only opening turns of signed-in users are cached: a follow-up depends on the
+        # conversation, and anonymous users would otherwise share one scope
+        if intent not in self.SEMANTIC_CACHE_INTENTS or history or user_id is None:
+            return await self._generate_response(message, history, token_queue=token_queue)
+
+        embedding = message_embedding
+        if embedding is None:
+            embedding = await self.pinecone_service.aembed(message)
+        cached = self.semantic_cache.get(embedding, scope=user_id)
+        if cached is not None:
+            if token_queue is not None:
+                token_queue.put_nowait(cached)
+            return cached
+
+        response = await self._generate_response(message, history, token_queue=token_queue)
+        if response != GENERATION_ERROR_MESSAGE:
+            self.semantic_cache.set(embedding, response, scope=user_id)
+        return response
 
     async def process_message(
         self,
@@ -447,7 +704,8 @@ You have access to tools - use them when needed to provide accurate, up-to-date
         db: Session,
         session_id: Optional[str] = None,
         user_id: Optional[int] = None,
-        max_tool_iterations: int = 3
+        max_tool_iterations: int = 3,
+        token_queue: Optional[asyncio.Queue] = None
     ) -> AgentChatResponse:
         """
         Process a user message with full agent capabilities.
@@ -457,13 +715,46 @@ You have access to tools - use them when needed to provide accurate, up-to-date
         2. Determine if tools are needed
         3. Execute tools iteratively
         4. Generate final response with context
+
+        When token_queue is given, the final response is also streamed into
+        it chunk by chunk as it is generated (see stream_message).
         """
         session = await self._get_or_create_session(db, session_id, user_id)
-        history = await self._get_conversation_history(db, session.id)
-        intent_result = await self.llm_service.classify_intent(message, history)
+        history = await self._get_conversation_history(db, session)
+        # The semantic intent cache only applies without history; the embedding is reused below
+        message_embedding = None if history else await self.pinecone_service.aembed(message)
+
+        # Speculatively search with the raw message while the intent is classified;
+        # product searches then start from these results instead of asking the LLM first.
+        # Only messages that look like searches pay for it: a cancelled prefetch still
+        # finishes its embedding and Pinecone query.
+        prefetch_call = {"call_id": "", "tool_name": "search_products", "arguments": {"query": message}}
+        search_prefetch: Optional[asyncio.Task] = None
+        if PRODUCT_SEARCH_HINT_PATTERN.search(message):
+            search_prefetch = asyncio.create_task(self.execute_tool(
+                tool_name=prefetch_call["tool_name"],
+                arguments=prefetch_call["arguments"],
+                db=db,
+                user_id=user_id
+            ))
+        try:
+            intent_result = await self.llm_service.classify_intent(
+                message, history, message_embedding=message_embedding
+            )
+        except BaseException:
+            if search_prefetch is not None:
+                search_prefetch.cancel()
+            raise
+
+        prefetched: Optional[ToolResult] = None
+        if search_prefetch is not None:
+            if intent_result.intent == Intent.PRODUCT_SEARCH:
+                prefetched = await search_prefetch
+                prefetch_call["call_id"] = prefetched.call_id
+            else:
+                search_prefetch.cancel()
 
-        await self._save_message(
-            db=db,
+        user_message = self._build_message(
             session_id=session.id,
             role="user",
             content=message,
@@ -474,14 +765,18 @@ You have access to tools - use them when needed to provide accurate, up-to-date
         tool_calls_made: List[str] = []
         tool_results: List[Dict[str, Any]] = []
         suggestions: List[ProductResponse] = []
+        seen_ids: Set[int] = set()
         accumulated_results: List[Dict[str, Any]] = []
         response = ""
 
         if intent_result.intent in [Intent.GREETING, Intent.FAREWELL]:
-            response = await self.llm_service.generate_response(
+            response = await self._generate_cached_response(
                 message=message,
-                system_prompt=self.SYSTEM_PROMPT,
-                conversation_history=history
+                history=history,
+                intent=intent_result.intent,
+                user_id=user_id,
+                message_embedding=message_embedding,
+                token_queue=token_queue
             )
 
         elif intent_result.intent in [
@@ -489,32 +784,79 @@ You have access to tools - use them when needed to provide accurate, up-to-date
             Intent.PRODUCT_RECOMMENDATION,
             Intent.PRODUCT_DETAILS
         ]:
-            iteration = 0
-            llm_response = None
-
-            while iteration < max_tool_iterations:
-                context_history = history.copy()
-                if accumulated_results:
-                    context_history.append({
-                        "role": "assistant",
-                        "content": f"Tool results so far: {json.dumps(accumulated_results, default=str)}"
-                    })
-
-                llm_response = await self.llm_service.call_with_tools(
-                    message=message,
-                    tools=self.toolkit.TOOLS,
-                    system_prompt=self.SYSTEM_PROMPT,
-                    conversation_history=context_history
+            product_names = intent_result.entities.product_names or []
+            if intent_result.intent == Intent.PRODUCT_DETAILS and len(product_names) == 1:
+                # The extracted entities already determine the tool call, so skip the ReAct loop
+                result = await self.execute_tool(
+                    tool_name="get_product_details",
+                    arguments={"product_name": product_names[0]},
+                    db=db,
+                    user_id=user_id
                 )
-
-                if llm_response.tool_calls:
-                    for tool_call in llm_response.tool_calls:
-                        result = await self.execute_tool(
-                            tool_name=tool_call["tool_name"],
-                            arguments=tool_call["arguments"],
-                            db=db,
-                            user_id=user_id
-                        )
+                tool_results.append(result.model_dump())
+                tool_calls_made.append("get_product_details")
+                accumulated_results.append({
+                    "tool": "get_product_details",
+                    "result": result.result
+                })
+            else:
+                iteration = 0
+                tool_messages: List[Dict[str, Any]] = []
+
+                while iteration < max_tool_iterations:
+                    if prefetched is not None and prefetched.success:
+                        # Present the prefetched search as if the model had requested it
+                        tool_calls = [prefetch_call]
+                        results = [prefetched]
+                        prefetched = None
+                    else:
+                        tool_calls = []
+                        pending_tools: List[asyncio.Task] = []
+                        content_parts: List[str] = []
+
+                        # Start each tool as soon as its call has streamed in, so tool
+                        # execution overlaps with the rest of the generation
+                        async for event in self.llm_service.stream_with_tools(
+                            message=message,
+                            tools=self.toolkit.TOOLS,
+                            tools_json=self.toolkit.TOOLS_JSON,
+                            system_prompt=self.SYSTEM_PROMPT,
+                            conversation_history=history,
+                            tool_messages=tool_messages
+                        ):
+                            if event.type == "tool_call":
+                                tool_calls.append(event.tool_call)
+                                pending_tools.append(asyncio.create_task(self.execute_tool(
+                                    tool_name=event.tool_call["tool_name"],
+                                    arguments=event.tool_call["arguments"],
+                                    db=db,
+                                    user_id=user_id
+                                )))
+                            elif event.type == "content":
+                                content_parts.append(event.content)
+
+                        if not tool_calls:
+                            if content_parts:
+                                response = "".join(content_parts)
+                                # Flushed only now: text from an iteration that ends in tool
+                                # calls is preamble, not part of the final response
+                                if token_queue is not None:
+                                    token_queue.put_nowait(response)
+                            break
+
+                        results = await asyncio.gather(*pending_tools)
+
+                    tool_messages.extend(self.llm_service.build_tool_messages(
+                        tool_calls,
+                        [
+                            result.result if result.success else {"error": result.error_message}
+                            for result in results
+                        ]
+                    ))
+
+                    suggestion_ids: List[int] = []
+                    open_slots = self.MAX_SUGGESTIONS - len(suggestions)
+                    for tool_call, result in zip(tool_calls, results):
                         tool_results.append(result.model_dump())
                         tool_calls_made.append(tool_call["tool_name"])
                         accumulated_results.append({
@@ -523,28 +865,28 @@ You have access to tools - use them when needed to provide accurate, up-to-date
                         })
 
                         if result.success and result.result and isinstance(result.result, list):
-                            for item in result.result[:5]:
-                                if isinstance(item, dict) and "id" in item:
-                                    product = db.query(Product).filter(
-                                        Product.id == item["id"]
-                                    ).first()
-                                    if product:
-                                        suggestions.append(
-                                            ProductResponse.model_validate(product)
-                                        )
+                            for item in result.result[:self.MAX_SUGGESTIONS]:
+                                if len(suggestion_ids) >= open_slots:
+                                    break
+                                if isinstance(item, dict) and "id" in item and item["id"] not in seen_ids:
+                                    seen_ids.add(item["id"])
+                                    suggestion_ids.append(item["id"])
+
+                    # Skips the query entirely once earlier iterations filled every slot
+                    if suggestion_ids:
+                        suggestions.extend(product_list_adapter.validate_python(
+                            self._get_products_by_ids(db, suggestion_ids),
+                            from_attributes=True
+                        ))
 
                     iteration += 1
-                else:
-                    if llm_response.content:
-                        response = llm_response.content
-                    break
 
             if not response:
-                response = await self.llm_service.generate_response(
-                    message=message,
-                    system_prompt=self.SYSTEM_PROMPT,
-                    conversation_history=history,
-                    tool_results=accumulated_results
+                response = await self._generate_response(
+                    message,
+                    history,
+                    tool_results=accumulated_results,
+                    token_queue=token_queue
                 )
 
         elif intent_result.intent in [Intent.ORDER_HELP, Intent.ORDER_STATUS]:
@@ -575,28 +917,31 @@ You have access to tools - use them when needed to provide accurate, up-to-date
                     "result": result.result
                 })
 
-            response = await self.llm_service.generate_response(
-                message=message,
-                system_prompt=self.SYSTEM_PROMPT,
-                conversation_history=history,
-                tool_results=accumulated_results
+            response = await self._generate_response(
+                message,
+                history,
+                tool_results=accumulated_results,
+                token_queue=token_queue
             )
 
         else:
-            response = await self.llm_service.generate_response(
+            response = await self._generate_cached_response(
                 message=message,
-                system_prompt=self.SYSTEM_PROMPT,
-                conversation_history=history
+                history=history,
+                intent=intent_result.intent,
+                user_id=user_id,
+                message_embedding=message_embedding,
+                token_queue=token_queue
             )
 
-        await self._save_message(
-            db=db,
+        assistant_message = self._build_message(
             session_id=session.id,
             role="assistant",
             content=response,
             tool_calls=tool_calls_made if tool_calls_made else None,
             tool_results=tool_results if tool_results else None
         )
+        await self._save_messages(db, session.id, [user_message, assistant_message])
 
         follow_up_questions = self._get_follow_up_questions(intent_result.intent)
 
@@ -605,7 +950,35 @@ You have access to tools - use them when needed to provide accurate, up-to-date
             session_id=session.id,
             intent=intent_result.intent,
             entities=intent_result.entities,
-            suggestions=suggestions[:5] if suggestions else None,
+            suggestions=suggestions or None,
             tool_calls_made=tool_calls_made if tool_calls_made else None,
             follow_up_questions=follow_up_questions
         )
+
+    async def stream_message(
+        self,
+        message: str,
+        db: Session,
+        session_id: Optional[str] = None,
+        user_id: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a user message, yielding the reply as it is generated.
+
+        Yields {"type": "token", "content": ...} events followed by a single
+        {"type": "done", "response": AgentChatResponse} event.
+        """
+        token_queue: asyncio.Queue = asyncio.Queue()
+        turn = asyncio.create_task(self.process_message(
+            message=message,
+            db=db,
+            session_id=session_id,
+            user_id=user_id,
+            token_queue=token_queue
+        ))
+        turn.add_done_callback(lambda _: token_queue.put_nowait(None))
+
+        while (token := await token_queue.get()) is not None:
+            yield {"type": "token", "content": token}
+
+        yield {"type": "done", "response": await turn}
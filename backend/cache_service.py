@@ -0,0 +1,228 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+import hashlib
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import orjson
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Build a stable sha256 cache key from JSON-serializable parts."""
+    payload = orjson.dumps(parts, default=str, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(payload).hexdigest()
+
+
+def quantize_int8(embeddings: np.ndarray) -> np.ndarray:
+    """Scale normalized embeddings by 127 and round them to int8."""
+    return np.clip(np.round(np.asarray(embeddings) * 127), -127, 127).astype(np.int8)
+
+
+class LRUCache:
+    """
+    In-process LRU cache with an optional per-entry time-to-live.
+
+    Not thread-safe; intended for state owned by a single event loop.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss or expired entry."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stored_at, value = entry
+        if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store value under key, evicting the least recently used entry if full."""
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """Remove key and return its value if present."""
+        entry = self._data.pop(key, None)
+        return entry[1] if entry else None
+
+    def clear(self) -> None:
+        """Drop every cached entry."""
+        self._data.clear()
+
+    def cache_info(self) -> Dict[str, int]:
+        """Return hit/miss counters and current size, like functools.lru_cache."""
+        return {"hits": self.hits, "misses": self.misses, "maxsize": self.maxsize, "currsize": len(self._data)}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache over normalized embeddings.
+
+    Entries are partitioned by scope (e.g. user ID) so answers never leak
+    across users. Each scope keeps at most maxsize entries, oldest evicted first,
+    and at most max_scopes scopes are kept, least recently used evicted first.
+    With quantize set, embeddings are held as int8 and compared with integer
+    dot products, using a quarter of the memory at a small cost in precision.
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        threshold: float = 0.92,
+        maxsize: int = 1024,
+        quantize: bool = False,
+        max_scopes: int = 256
+    ):
+        self.dimension = dimension
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.quantize = quantize
+        self.max_scopes = max_scopes
+        self._embeddings: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._values: Dict[Hashable, List[Any]] = {}
+
+    def get(self, embedding: np.ndarray, scope: Hashable = None) -> Optional[Any]:
+        """Return the value stored for the most similar embedding above threshold."""
+        matrix = self._embeddings.get(scope)
+        if matrix is None or not len(matrix):
+            return None
+        self._embeddings.move_to_end(scope)
+
+        if self.quantize:
+            # int32 accumulation avoids int8 overflow; 127**2 restores the cosine scale
+            similarities = np.matmul(matrix, quantize_int8(embedding), dtype=np.int32) / 127 ** 2
+        else:
+            similarities = matrix @ np.asarray(embedding, dtype=np.float32)
+        best = int(similarities.argmax())
+        if similarities[best] < self.threshold:
+            return None
+        return self._values[scope][best]
+
+    def set(self, embedding: np.ndarray, value: Any, scope: Hashable = None) -> None:
+        """Store value under embedding, evicting the oldest entry of the scope if full."""
+        if self.quantize:
+            row = quantize_int8(embedding).reshape(1, self.dimension)
+        else:
+            row = np.asarray(embedding, dtype=np.float32).reshape(1, self.dimension)
+        matrix = self._embeddings.get(scope)
+        values = self._values.setdefault(scope, [])
+
+        if matrix is None:
+            matrix = row
+        else:
+            matrix = np.vstack([matrix, row])
+        values.append(value)
+
+        if len(values) > self.maxsize:
+            matrix = matrix[1:]
+            del values[0]
+
+        self._embeddings[scope] = matrix
+        self._embeddings.move_to_end(scope)
+        if len(self._embeddings) > self.max_scopes:
+            evicted, _ = self._embeddings.popitem(last=False)
+            del self._values[evicted]
+
+    def clear(self) -> None:
+        """Drop every cached entry in every scope."""
+        self._embeddings.clear()
+        self._values.clear()
+
+
+class EmbeddingStore:
+    """
+    Disk-backed embedding cache keyed by a hash of the model name and text.
+
+    Vectors are stored as float32, or as int8 (scaled by 127) when
+    quantize is set, and returned as normalized float32. Quantizing
+    assumes normalized embeddings. Safe to use from worker threads.
+    """
+
+    # Stay under SQLite's limit on bound parameters per statement
+    _LOOKUP_CHUNK = 500
+
+    def __init__(self, path: str, namespace: str, quantize: bool = False):
+        self.dtype = np.int8 if quantize else np.float32
+        # Different storage formats never share entries
+        self.namespace = f"{namespace}:{np.dtype(self.dtype).name}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(hash BLOB PRIMARY KEY, dim INTEGER NOT NULL, vec BLOB NOT NULL)"
+            )
+            self._conn.commit()
+
+    def _hash(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Return the stored embedding for each text, or None where there is none."""
+        hashes = [self._hash(text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            for start in range(0, len(hashes), self._LOOKUP_CHUNK):
+                chunk = hashes[start:start + self._LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT hash, vec FROM embeddings WHERE hash IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for key, vec in rows:
+                    found[key] = self._decode(vec)
+        return [found.get(key) for key in hashes]
+
+    def _encode_vector(self, embedding: np.ndarray) -> bytes:
+        if self.dtype is np.int8:
+            return quantize_int8(embedding).tobytes()
+        return embedding.astype(np.float32).tobytes()
+
+    def _decode(self, vec: bytes) -> np.ndarray:
+        embedding = np.frombuffer(vec, dtype=self.dtype).astype(np.float32)
+        if self.dtype is np.int8:
+            # Renormalize so dot products stay cosine similarities
+            embedding /= np.linalg.norm(embedding) or 1.0
+        return embedding
+
+    def set_many(self, texts: List[str], embeddings: np.ndarray) -> List[np.ndarray]:
+        """
+        Store one embedding per text, replacing existing entries.
+
+        Returns the embeddings as get_many will later return them, so callers
+        can use the same quantized representation on a miss as on a hit.
+        """
+        rows = [
+            (self._hash(text), int(embedding.shape[-1]), self._encode_vector(embedding))
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (hash, dim, vec) VALUES (?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+        return [self._decode(vec) for _, _, vec in rows]
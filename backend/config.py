@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -12,6 +13,23 @@ class Settings(BaseSettings):
         description="Database connection URL"
     )
 
+    db_pool_size: int = Field(
+        default=20,
+        description="Number of persistent connections kept in the pool"
+    )
+    db_max_overflow: int = Field(
+        default=40,
+        description="Extra connections allowed beyond pool size under load"
+    )
+    db_pool_recycle: int = Field(
+        default=1800,
+        description="Seconds after which pooled connections are recycled"
+    )
+    db_create_tables_on_startup: bool = Field(
+        default=True,
+        description="Create missing tables at startup; disable when migrations run at deploy time"
+    )
+
     # JWT Authentication
     secret_key: str = Field(
         default="your-secret-key-change-in-production",
@@ -31,10 +49,62 @@ class Settings(BaseSettings):
         default="llama-3.3-70b-versatile",
         description="Groq model to use"
     )
+    groq_classifier_model: str = Field(
+        default="llama-3.1-8b-instant",
+        description="Faster Groq model used for intent classification"
+    )
+    intent_batch_window_ms: float = Field(
+        default=5.0,
+        description="Milliseconds to collect concurrent intent classifications before sending them together"
+    )
+    intent_batch_size: int = Field(
+        default=16,
+        description="Flush the intent classification batch early once it reaches this size"
+    )
     groq_max_tokens: int = Field(
         default=4096,
         description="Maximum tokens for LLM response"
     )
+    tool_result_char_budget: int = Field(
+        default=4000,
+        description="Maximum characters of each tool result included in the response prompt"
+    )
+
+    # LLM Response Cache
+    llm_cache_size: int = Field(
+        default=2048,
+        description="Maximum number of cached LLM responses (temperature 0 calls only)"
+    )
+    llm_cache_ttl: int = Field(
+        default=3600,
+        description="Time-to-live for cached LLM responses in seconds"
+    )
+
+    intent_cache_size: int = Field(
+        default=4096,
+        description="Maximum number of cached intent classifications"
+    )
+
+    # Semantic Response Cache
+    semantic_cache_threshold: float = Field(
+        default=0.92,
+        description="Minimum cosine similarity for a semantic cache hit"
+    )
+    semantic_cache_size: int = Field(
+        default=1024,
+        description="Maximum number of cached prompts per user scope"
+    )
+
+    # Conversation History Cache
+    history_cache_sessions: int = Field(
+        default=1024,
+        description="Maximum number of sessions whose recent history is kept in memory"
+    )
+
+    history_token_budget: int = Field(
+        default=2048,
+        description="Estimated history tokens before older messages are summarized"
+    )
 
     # Pinecone Vector DB
     pinecone_api_key: str = Field(
@@ -53,16 +123,56 @@ class Settings(BaseSettings):
         default="us-east-1",
         description="Pinecone region"
     )
+    pinecone_use_grpc: bool = Field(
+        default=False,
+        description="Talk to Pinecone over gRPC/protobuf instead of REST/JSON"
+    )
 
     # Embedding Model
     embedding_model: str = Field(
         default="all-MiniLM-L6-v2",
         description="Sentence transformer model for embeddings"
     )
+    embedding_backend: str = Field(
+        default="onnx",
+        description="Sentence transformer inference backend: torch, onnx, or openvino"
+    )
+    embedding_num_threads: int = Field(
+        default=0,
+        description="CPU threads for the torch embedding backend; 0 keeps the torch default"
+    )
+    embedding_onnx_file: str = Field(
+        default="onnx/model_qint8_avx512_vnni.onnx",
+        description="ONNX model file used with the onnx backend; INT8 VNNI files fall back to model_qint8_arm64.onnx on ARM64 and model.onnx on other CPUs without VNNI"
+    )
+    embedding_max_seq_length: Optional[int] = Field(
+        default=None,
+        description="Token limit for embedding inputs (e.g. 128); longer texts are truncated. None keeps the model default; changing it requires a reindex"
+    )
     embedding_dimension: int = Field(
         default=384,
         description="Embedding vector dimension"
     )
+    use_static_embeddings: bool = Field(
+        default=False,
+        description="Use a model2vec static embedding model instead of the sentence transformer"
+    )
+    static_embedding_model: str = Field(
+        default="minishlab/potion-base-8M",
+        description="model2vec model used when use_static_embeddings is enabled"
+    )
+    embedding_cache_size: int = Field(
+        default=2048,
+        description="Maximum number of query embeddings kept in memory"
+    )
+    embedding_store_path: str = Field(
+        default="./embeddings.db",
+        description="SQLite file caching embeddings across restarts; empty to disable"
+    )
+    embedding_store_int8: bool = Field(
+        default=False,
+        description="Store persisted embeddings as int8 instead of float32; quantized vectors are also what gets upserted"
+    )
 
     # Search Settings
     search_top_k: int = Field(
@@ -73,6 +183,32 @@ class Settings(BaseSettings):
         default=0.3,
         description="Minimum similarity score threshold"
     )
+    search_cache_threshold: float = Field(
+        default=0.97,
+        description="Cosine similarity above which a previous query's Pinecone matches are reused"
+    )
+    search_cache_size: int = Field(
+        default=500,
+        description="Maximum number of cached query matches per set of search parameters"
+    )
+    search_cache_max_scopes: int = Field(
+        default=64,
+        description="Maximum number of distinct search parameter sets kept in the search cache"
+    )
+    search_cache_int8: bool = Field(
+        default=True,
+        description="Hold semantic search cache embeddings as int8 instead of float32"
+    )
+
+    # HTTP Caching
+    product_cache_max_age: int = Field(
+        default=60,
+        description="Cache-Control max-age in seconds for product read endpoints"
+    )
+    product_version_ttl: int = Field(
+        default=30,
+        description="Seconds a product list ETag version is reused before re-querying"
+    )
 
     # Email (Optional)
     smtp_server: str = Field(
@@ -95,7 +231,8 @@ class Settings(BaseSettings):
     model_config = {
         "env_file": ".env",
         "env_file_encoding": "utf-8",
-        "extra": "ignore"
+        "extra": "ignore",
+        "frozen": True
     }
 
 
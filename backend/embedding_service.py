@@ -0,0 +1,90 @@
+from typing import TYPE_CHECKING, Optional
+import platform
+import threading
+
+from config import get_settings
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+# Plain FP32 export, which runs on any CPU
+ONNX_FALLBACK_FILE = "onnx/model.onnx"
+# INT8 export tuned for ARM64 (Apple silicon, Graviton)
+ONNX_ARM64_FILE = "onnx/model_qint8_arm64.onnx"
+
+_model: Optional["SentenceTransformer"] = None
+_model_lock = threading.Lock()
+
+
+def _cpu_supports_vnni() -> bool:
+    """Return True if the CPU advertises AVX-512 VNNI (Linux only)."""
+    try:
+        with open("/proc/cpuinfo") as cpuinfo:
+            return "avx512_vnni" in cpuinfo.read()
+    except OSError:
+        return False
+
+
+def _onnx_file(file_name: str) -> str:
+    """Replace a VNNI-only INT8 file on CPUs without VNNI: ARM64 INT8 on ARM, FP32 elsewhere."""
+    if "vnni" in file_name and not _cpu_supports_vnni():
+        if platform.machine().lower() in ("arm64", "aarch64"):
+            return ONNX_ARM64_FILE
+        return ONNX_FALLBACK_FILE
+    return file_name
+
+
+def embedding_model_id() -> str:
+    """Identify the configured model, backend and ONNX file, e.g. for cache namespaces."""
+    settings = get_settings()
+    # Truncation changes embeddings of long texts, so the token limit is part of the identity
+    model_id = f"{settings.embedding_model}:{settings.embedding_backend}"
+    if settings.embedding_max_seq_length:
+        model_id = f"{model_id}:{settings.embedding_max_seq_length}"
+    if settings.embedding_backend != "onnx":
+        return model_id
+    return f"{model_id}:{_onnx_file(settings.embedding_onnx_file)}"
+
+
+def load_sentence_transformer() -> "SentenceTransformer":
+    """
+    Load the configured sentence transformer and warm it up.
+
+    With the onnx backend the configured ONNX file (INT8 by default) is
+    used. When embedding_max_seq_length is set, inputs are truncated to
+    that many tokens, which keeps attention cost low for short product
+    texts and queries. The
+    warmup encode pays graph-optimization cost at load time instead of
+    on the first request.
+    """
+    # Imported here so processes that never embed skip loading torch/onnxruntime
+    from sentence_transformers import SentenceTransformer
+
+    settings = get_settings()
+    if settings.embedding_backend == "torch" and settings.embedding_num_threads > 0:
+        import torch
+        torch.set_num_threads(settings.embedding_num_threads)
+
+    model_kwargs = None
+    if settings.embedding_backend == "onnx" and settings.embedding_onnx_file:
+        model_kwargs = {"file_name": _onnx_file(settings.embedding_onnx_file)}
+
+    model = SentenceTransformer(
+        settings.embedding_model,
+        backend=settings.embedding_backend,
+        model_kwargs=model_kwargs
+    )
+    if settings.embedding_max_seq_length:
+        model.max_seq_length = settings.embedding_max_seq_length
+    model.encode(["warmup"], show_progress_bar=False)
+    return model
+
+
+def get_sentence_transformer() -> "SentenceTransformer":
+    """Return the process-wide sentence transformer, loading it on first use."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = load_sentence_transformer()
+    return _model
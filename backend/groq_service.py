@@ -1,11 +1,61 @@
-from groq import Groq
+from groq import AsyncGroq
+import httpx
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
-import json
+from typing import List, Dict, Any, AsyncIterator, Optional, Sequence, Set, Tuple
+import asyncio
+import re
 
+import numpy as np
+import orjson
+
+from cache_service import LRUCache, SemanticCache, make_cache_key
 from config import get_settings
 from schemas import Intent, ExtractedEntities, IntentClassificationResult
 
+# Messages that refer back to earlier turns need history to classify, so they bypass the intent cache
+CONTEXT_DEPENDENT_PATTERN = re.compile(r"\b(it|its|that|this|them|those|these)\b")
+# Order ids, quantities and prices that a near-duplicate message would get wrong
+LITERAL_ENTITY_PATTERN = re.compile(r"[\d$€£]")
+
+INTENT_SYSTEM_PROMPT = """You are an intent classification system for an e-commerce shopping platform.
+
+Analyze the user message and respond with a JSON object containing:
+1. "intent": One of these exact values:
+   - "product_search" - User wants to find/search for products
+   - "product_recommendation" - User wants suggestions/recommendations
+   - "product_details" - User asks about a specific product
+   - "order_help" - User needs help with orders
+   - "order_status" - User wants to check order status
+   - "general_question" - General questions about the store
+   - "greeting" - Hello, hi, etc.
+   - "farewell" - Goodbye, thanks, etc.
+   - "complaint" - User is unhappy or complaining
+   - "unknown" - Cannot determine intent
+
+2. "confidence": A float between 0.0 and 1.0 indicating how confident you are
+
+3. "entities": An object that may contain:
+   - "product_names": Array of product names mentioned
+   - "categories": Array of categories (e.g., "electronics", "clothing", "shoes")
+   - "brands": Array of brand names mentioned
+   - "price_min": Minimum price if mentioned (number)
+   - "price_max": Maximum price if mentioned (number)
+   - "order_id": Order ID if mentioned (number)
+   - "quantity": Quantity if mentioned (number)
+   - "attributes": Object with other attributes (color, size, etc.)
+
+4. "requires_clarification": Boolean, true if the intent is unclear
+
+5. "clarification_question": If requires_clarification is true, suggest a question to ask
+
+Respond ONLY with valid JSON, no other text."""
+
+# Shared across calls; the SDK does not mutate request messages
+INTENT_SYSTEM_MESSAGE = {"role": "system", "content": INTENT_SYSTEM_PROMPT}
+INTENT_RESPONSE_FORMAT = {"type": "json_object"}
+
+GENERATION_ERROR_MESSAGE = "I apologize, but I encountered an error processing your request. Please try again."
+
 
 class ChatMessage(BaseModel):
     """Represents a chat message for LLM context."""
@@ -22,6 +72,19 @@ class LLMResponse(BaseModel):
     )
 
 
+class LLMStreamEvent(BaseModel):
+    """Incremental event from a streamed tool-calling completion."""
+    type: str = Field(..., description="Event type: content, tool_call, or done")
+    content: Optional[str] = Field(
+        default=None,
+        description="Content delta for content events"
+    )
+    tool_call: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="Completed ToolCallRequest dict for tool_call events"
+    )
+
+
 class ToolCallRequest(BaseModel):
     """Represents a tool call request from the LLM."""
     call_id: str = Field(..., description="Unique identifier for the tool call")
@@ -32,6 +95,58 @@ class ToolCallRequest(BaseModel):
     )
 
 
+class IncrementalJsonParser:
+    """
+    Accumulates a streamed JSON object and detects when it is complete.
+
+    Each delta is scanned once for string/escape state and brace depth, so
+    detecting completion is linear in the total payload instead of
+    re-parsing the growing buffer on every delta.
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._started = False
+        self.complete = False
+
+    def feed(self, delta: str) -> bool:
+        """Consume a delta and return True once the top-level object has closed."""
+        self._parts.append(delta)
+        if self.complete:
+            return True
+
+        for char in delta:
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+                self._started = True
+            elif char in "}]":
+                self._depth -= 1
+                if self._started and self._depth == 0:
+                    self.complete = True
+                    break
+        return self.complete
+
+    def getvalue(self) -> str:
+        """Return the raw JSON text accumulated so far."""
+        return "".join(self._parts)
+
+    def parse(self) -> Dict[str, Any]:
+        """Decode the accumulated JSON, treating an empty payload as {}."""
+        return orjson.loads(self.getvalue() or "{}")
+
+
 class GroqLLMService:
     """Service for LLM operations using Groq with Llama 3.3 70B."""
 
@@ -40,22 +155,121 @@ class GroqLLMService:
         if not settings.groq_api_key:
             raise ValueError("GROQ_API_KEY environment variable is not set")
 
-        self.client = Groq(api_key=settings.groq_api_key)
+        # One pooled HTTP/2 client shared by classify, generate and tool calls keeps
+        # connections warm across requests instead of paying a TLS handshake per call
+        self._http = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50, keepalive_expiry=60),
+            timeout=httpx.Timeout(30.0, connect=5.0)
+        )
+        self.client = AsyncGroq(api_key=settings.groq_api_key, http_client=self._http)
         self.model = settings.groq_model
+        self.classifier_model = settings.groq_classifier_model
         self.max_tokens = settings.groq_max_tokens
+        self.tool_result_char_budget = settings.tool_result_char_budget
+        self.response_cache = LRUCache(
+            maxsize=settings.llm_cache_size,
+            ttl=settings.llm_cache_ttl
+        )
+        self.intent_cache = LRUCache(maxsize=settings.intent_cache_size)
+        self.intent_semantic_cache = SemanticCache(
+            dimension=settings.embedding_dimension,
+            threshold=settings.semantic_cache_threshold,
+            maxsize=settings.intent_cache_size
+        )
+        self.intent_batch_window = settings.intent_batch_window_ms / 1000
+        self.intent_batch_size = settings.intent_batch_size
+        self._intent_batch: List[Tuple[List[Dict[str, Any]], asyncio.Future]] = []
+        self._intent_flush_handle: Optional[asyncio.TimerHandle] = None
+        self._intent_inflight: Dict[str, asyncio.Future] = {}
+        # Strong references so running batches are not garbage-collected mid-flight
+        self._intent_batch_tasks: Set[asyncio.Task] = set()
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP client."""
+        await self._http.aclose()
+
+    def _submit_classification(self, messages: List[Dict[str, Any]]) -> asyncio.Future:
+        """
+        Queue a classification request for the next micro-batch.
+
+        Concurrent requests with identical messages, history included, share
+        one future, so a burst of identical requests costs a single Groq call.
+        """
+        inflight_key = make_cache_key(self.classifier_model, messages)
+        if inflight_key in self._intent_inflight:
+            return self._intent_inflight[inflight_key]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._intent_batch.append((messages, future))
+
+        self._intent_inflight[inflight_key] = future
+        future.add_done_callback(lambda _: self._intent_inflight.pop(inflight_key, None))
+
+        if len(self._intent_batch) >= self.intent_batch_size:
+            self._flush_intent_batch()
+        elif self._intent_flush_handle is None:
+            self._intent_flush_handle = loop.call_later(self.intent_batch_window, self._flush_intent_batch)
+
+        return future
+
+    def _flush_intent_batch(self) -> None:
+        """Send every queued classification request concurrently."""
+        if self._intent_flush_handle is not None:
+            self._intent_flush_handle.cancel()
+            self._intent_flush_handle = None
+
+        batch, self._intent_batch = self._intent_batch, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run_intent_batch(batch))
+            self._intent_batch_tasks.add(task)
+            task.add_done_callback(self._intent_batch_tasks.discard)
+
+    async def _run_intent_batch(self, batch: List[Tuple[List[Dict[str, Any]], asyncio.Future]]) -> None:
+        """Fan the batch out over the shared client and resolve each request's future."""
+        responses = await asyncio.gather(
+            *(
+                self.client.chat.completions.create(
+                    model=self.classifier_model,
+                    messages=messages,
+                    temperature=0.1,
+                    max_tokens=256,
+                    response_format=INTENT_RESPONSE_FORMAT
+                )
+                for messages, _ in batch
+            ),
+            return_exceptions=True
+        )
+
+        for (_, future), response in zip(batch, responses):
+            if future.done():
+                continue
+            if isinstance(response, BaseException):
+                future.set_exception(response)
+            else:
+                future.set_result(response.choices[0].message.content)
 
     def _build_messages(
         self,
         system_prompt: str,
         user_message: str,
         conversation_history: Optional[List[Dict[str, Any]]] = None,
-        tool_context: Optional[str] = None
-    ) -> List[Dict[str, str]]:
-        """Build messages list for LLM API call."""
+        tool_context: Optional[str] = None,
+        tool_messages: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Build messages list for LLM API call.
+
+        tool_messages are appended verbatim after the user message so the
+        system prompt and history stay a stable, cacheable prefix.
+        """
         messages = [{"role": "system", "content": system_prompt}]
 
         if conversation_history:
-            for msg in conversation_history[-10:]:
+            # A leading system message carries the summary of older turns; always keep it
+            pinned = conversation_history[:1] if conversation_history[0].get("role") == "system" else []
+            for msg in pinned + conversation_history[len(pinned):][-10:]:
                 messages.append({
                     "role": msg.get("role", "user"),
                     "content": msg.get("content", "")
@@ -65,51 +279,89 @@ class GroqLLMService:
             messages.append({"role": "system", "content": tool_context})
 
         messages.append({"role": "user", "content": user_message})
+
+        if tool_messages:
+            messages.extend(tool_messages)
+
+        return messages
+
+    @staticmethod
+    def build_tool_messages(
+        tool_calls: List[Dict[str, Any]],
+        tool_outputs: List[Any]
+    ) -> List[Dict[str, Any]]:
+        """
+        Build the assistant tool-call message and one tool message per output.
+
+        tool_calls are ToolCallRequest dicts as returned by call_with_tools and
+        tool_outputs are in the same order.
+        """
+        messages: List[Dict[str, Any]] = [{
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": tool_call["call_id"],
+                    "type": "function",
+                    "function": {
+                        "name": tool_call["tool_name"],
+                        "arguments": orjson.dumps(tool_call["arguments"]).decode("utf-8")
+                    }
+                }
+                for tool_call in tool_calls
+            ]
+        }]
+
+        for tool_call, output in zip(tool_calls, tool_outputs):
+            messages.append({
+                "role": "tool",
+                "tool_call_id": tool_call["call_id"],
+                "content": orjson.dumps(output, default=str).decode("utf-8")
+            })
+
         return messages
 
     async def classify_intent(
         self,
         message: str,
-        conversation_history: Optional[List[Dict]] = None
+        conversation_history: Optional[List[Dict]] = None,
+        message_embedding: Optional[np.ndarray] = None
     ) -> IntentClassificationResult:
         """
         Classify user intent and extract entities from message.
         Uses JSON mode for structured output.
-        """
-        system_prompt = """You are an intent classification system for an e-commerce shopping platform.
 
-Analyze the user message and respond with a JSON object containing:
-1. "intent": One of these exact values:
-   - "product_search" - User wants to find/search for products
-   - "product_recommendation" - User wants suggestions/recommendations
-   - "product_details" - User asks about a specific product
-   - "order_help" - User needs help with orders
-   - "order_status" - User wants to check order status
-   - "general_question" - General questions about the store
-   - "greeting" - Hello, hi, etc.
-   - "farewell" - Goodbye, thanks, etc.
-   - "complaint" - User is unhappy or complaining
-   - "unknown" - Cannot determine intent
-
-2. "confidence": A float between 0.0 and 1.0 indicating how confident you are
-
-3. "entities": An object that may contain:
-   - "product_names": Array of product names mentioned
-   - "categories": Array of categories (e.g., "electronics", "clothing", "shoes")
-   - "brands": Array of brand names mentioned
-   - "price_min": Minimum price if mentioned (number)
-   - "price_max": Maximum price if mentioned (number)
-   - "order_id": Order ID if mentioned (number)
-   - "quantity": Quantity if mentioned (number)
-   - "attributes": Object with other attributes (color, size, etc.)
-
-4. "requires_clarification": Boolean, true if the intent is unclear
-
-5. "clarification_question": If requires_clarification is true, suggest a question to ask
-
-Respond ONLY with valid JSON, no other text."""
+        Results are cached by normalized message text, except for messages
+        that refer back to earlier turns and for any turn with history, whose
+        entities may be resolved from that conversation. When a normalized message_embedding
+        is given and there is no history, paraphrases of earlier messages are
+        also served from a semantic cache. That cache only holds results
+        without entities and is skipped for messages containing numbers or
+        prices, so a paraphrase never inherits another message's order id,
+        prices or product names. Cache misses are sent to Groq in short
+        micro-batches shared with other concurrent requests.
+        """
+        normalized = " ".join(message.lower().split())[:200]
+        # Entities of a turn with history may come from that conversation, so neither
+        # cache tier is read or written for it
+        cacheable = not conversation_history
+        cache_key = normalized if cacheable and not CONTEXT_DEPENDENT_PATTERN.search(normalized) else None
+        if cache_key is not None:
+            cached = self.intent_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        use_semantic_cache = (
+            cacheable
+            and message_embedding is not None
+            and not LITERAL_ENTITY_PATTERN.search(normalized)
+        )
+        if use_semantic_cache:
+            cached = self.intent_semantic_cache.get(message_embedding)
+            if cached is not None:
+                return cached
 
-        messages = [{"role": "system", "content": system_prompt}]
+        messages = [INTENT_SYSTEM_MESSAGE]
 
         if conversation_history:
             for msg in conversation_history[-5:]:
@@ -121,15 +373,9 @@ Respond ONLY with valid JSON, no other text."""
         messages.append({"role": "user", "content": f"Classify this message: {message}"})
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.1,
-                max_tokens=1000,
-                response_format={"type": "json_object"}
-            )
-
-            result = json.loads(response.choices[0].message.content)
+            # shield keeps one cancelled caller from cancelling a future shared with others
+            content = await asyncio.shield(self._submit_classification(messages))
+            result = orjson.loads(content)
 
             # Parse intent safely
             intent_str = result.get("intent", "unknown")
@@ -142,13 +388,19 @@ Respond ONLY with valid JSON, no other text."""
             entities_data = result.get("entities", {})
             entities = ExtractedEntities.model_validate(entities_data)
 
-            return IntentClassificationResult(
+            classification = IntentClassificationResult(
                 intent=intent,
                 confidence=float(result.get("confidence", 0.5)),
                 entities=entities,
                 requires_clarification=result.get("requires_clarification", False),
                 clarification_question=result.get("clarification_question")
             )
+            if cache_key is not None:
+                self.intent_cache.set(cache_key, classification)
+            if use_semantic_cache and not any(entities.model_dump(exclude_none=True).values()):
+                # Entity-free results carry nothing specific to this message or user
+                self.intent_semantic_cache.set(message_embedding, classification)
+            return classification
 
         except Exception:
             return IntentClassificationResult(
@@ -159,64 +411,155 @@ Respond ONLY with valid JSON, no other text."""
                 clarification_question="I'm not sure I understood that. Could you please rephrase?"
             )
 
+    def _build_tool_context(self, tool_results: Optional[List[Dict]]) -> Optional[str]:
+        """Render tool results as a context block for the final response."""
+        if not tool_results:
+            return None
+
+        parts = ["Here are the results from the tools I used to help answer your question:\n\n"]
+        for result in tool_results:
+            # Compact JSON keeps the prompt small; oversized results are cut to the budget
+            payload = orjson.dumps(result["result"], default=str).decode("utf-8")
+            if len(payload) > self.tool_result_char_budget:
+                payload = payload[:self.tool_result_char_budget] + "...(truncated)"
+            parts.append(f"**{result['tool']}**:\n```json\n{payload}\n```\n\n")
+        return "".join(parts)
+
+    def _response_cache_key(self, kind: str, temperature: float, *parts: Any) -> Optional[str]:
+        """Key for the response cache, or None when sampling makes the output non-deterministic."""
+        if temperature != 0:
+            return None
+        return make_cache_key(kind, self.model, temperature, *parts)
+
     async def generate_response(
         self,
         message: str,
         system_prompt: str,
         conversation_history: Optional[List[Dict]] = None,
-        tool_results: Optional[List[Dict]] = None
+        tool_results: Optional[List[Dict]] = None,
+        temperature: float = 0.7
     ) -> str:
-        """Generate a conversational response using Groq LLM."""
-        tool_context = None
-        if tool_results:
-            tool_context = "Here are the results from the tools I used to help answer your question:\n\n"
-            for result in tool_results:
-                tool_context += f"**{result['tool_name']}**:\n```json\n{json.dumps(result['result'], indent=2, default=str)}\n```\n\n"
-
+        """Generate a conversational response using Groq LLM; only temperature 0 responses are cached."""
         messages = self._build_messages(
             system_prompt=system_prompt,
             user_message=message,
             conversation_history=conversation_history,
-            tool_context=tool_context
+            tool_context=self._build_tool_context(tool_results)
         )
 
+        cache_key = self._response_cache_key("generate_response", temperature, messages)
+        cached = self.response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            return cached
+
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
-                temperature=0.7,
+                temperature=temperature,
                 max_tokens=self.max_tokens
             )
-            return response.choices[0].message.content
+            content = response.choices[0].message.content
+            if cache_key:
+                self.response_cache.set(cache_key, content)
+            return content
 
         except Exception:
-            return "I apologize, but I encountered an error processing your request. Please try again."
+            return GENERATION_ERROR_MESSAGE
+
+    async def stream_response(
+        self,
+        message: str,
+        system_prompt: str,
+        conversation_history: Optional[List[Dict]] = None,
+        tool_results: Optional[List[Dict]] = None,
+        temperature: float = 0.7
+    ) -> AsyncIterator[str]:
+        """
+        Stream a conversational response from Groq as content deltas.
+
+        Takes the same arguments as generate_response and shares its response
+        cache, which only holds temperature 0 responses; a cached response is
+        yielded as a single chunk.
+        """
+        messages = self._build_messages(
+            system_prompt=system_prompt,
+            user_message=message,
+            conversation_history=conversation_history,
+            tool_context=self._build_tool_context(tool_results)
+        )
+
+        cache_key = self._response_cache_key("generate_response", temperature, messages)
+        cached = self.response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            yield cached
+            return
+
+        content_parts: List[str] = []
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=self.max_tokens,
+                stream=True
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    content_parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+
+        except Exception:
+            # Only fall back to the error message if nothing was streamed yet
+            if not content_parts:
+                yield GENERATION_ERROR_MESSAGE
+            return
+
+        if cache_key:
+            self.response_cache.set(cache_key, "".join(content_parts))
 
     async def call_with_tools(
         self,
         message: str,
-        tools: List[Dict],
+        tools: Sequence[Dict],
         system_prompt: str,
-        conversation_history: Optional[List[Dict]] = None
+        conversation_history: Optional[List[Dict]] = None,
+        tool_messages: Optional[List[Dict[str, Any]]] = None,
+        tools_json: Optional[str] = None,
+        temperature: float = 0.7
     ) -> LLMResponse:
         """
         Call Groq with function/tool calling capability.
 
+        tool_messages carries the assistant tool calls and tool outputs from
+        earlier iterations of the same turn (see build_tool_messages).
+        tools_json is an optional pre-serialized form of tools used to key the
+        response cache without re-encoding the schema on every call.
+
         Returns LLMResponse with either tool_calls or content.
         """
         messages = self._build_messages(
             system_prompt=system_prompt,
             user_message=message,
-            conversation_history=conversation_history
+            conversation_history=conversation_history,
+            tool_messages=tool_messages
         )
 
+        if tools_json is None:
+            tools_json = orjson.dumps(tools, option=orjson.OPT_SORT_KEYS).decode("utf-8")
+
+        cache_key = self._response_cache_key("call_with_tools", temperature, messages, tools_json)
+        cached = self.response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            return cached
+
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 tools=tools,
                 tool_choice="auto",
-                temperature=0.7,
+                temperature=temperature,
                 max_tokens=self.max_tokens
             )
 
@@ -228,19 +571,144 @@ Respond ONLY with valid JSON, no other text."""
                     tool_call_request = ToolCallRequest(
                         call_id=tool_call.id,
                         tool_name=tool_call.function.name,
-                        arguments=json.loads(tool_call.function.arguments)
+                        arguments=orjson.loads(tool_call.function.arguments)
                     )
                     tool_calls.append(tool_call_request.model_dump())
 
-                return LLMResponse(content="", tool_calls=tool_calls)
+                llm_response = LLMResponse(content="", tool_calls=tool_calls)
             else:
-                return LLMResponse(
+                llm_response = LLMResponse(
                     content=response_message.content or "",
                     tool_calls=None
                 )
 
+            if cache_key:
+                self.response_cache.set(cache_key, llm_response)
+            return llm_response
+
         except Exception as e:
             return LLMResponse(
                 content=f"I encountered an error: {str(e)}",
                 tool_calls=None
             )
+
+    async def stream_with_tools(
+        self,
+        message: str,
+        tools: Sequence[Dict],
+        system_prompt: str,
+        conversation_history: Optional[List[Dict]] = None,
+        tool_messages: Optional[List[Dict[str, Any]]] = None,
+        tools_json: Optional[str] = None,
+        temperature: float = 0.7
+    ) -> AsyncIterator[LLMStreamEvent]:
+        """
+        Stream a tool-calling completion from Groq.
+
+        Yields a tool_call event as soon as each tool call's arguments form a
+        complete JSON object (tracked by IncrementalJsonParser), so callers can start executing it while the rest of the
+        response is still generating, and a final done event. Takes the same
+        arguments as call_with_tools and shares its response cache.
+        """
+        messages = self._build_messages(
+            system_prompt=system_prompt,
+            user_message=message,
+            conversation_history=conversation_history,
+            tool_messages=tool_messages
+        )
+
+        if tools_json is None:
+            tools_json = orjson.dumps(tools, option=orjson.OPT_SORT_KEYS).decode("utf-8")
+
+        cache_key = self._response_cache_key("call_with_tools", temperature, messages, tools_json)
+        cached = self.response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            for tool_call in cached.tool_calls or []:
+                yield LLMStreamEvent(type="tool_call", tool_call=tool_call)
+            if cached.content:
+                yield LLMStreamEvent(type="content", content=cached.content)
+            yield LLMStreamEvent(type="done")
+            return
+
+        content_parts: List[str] = []
+        tool_calls: List[Dict[str, Any]] = []
+        current: Optional[Dict[str, Any]] = None
+        finished_index: Optional[int] = None
+
+        def finish_tool_call(partial: Dict[str, Any]) -> Dict[str, Any]:
+            tool_call = ToolCallRequest(
+                call_id=partial["id"],
+                tool_name=partial["name"],
+                arguments=partial["arguments"].parse()
+            ).model_dump()
+            tool_calls.append(tool_call)
+            return tool_call
+
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                tools=tools,
+                tool_choice="auto",
+                temperature=temperature,
+                max_tokens=self.max_tokens,
+                stream=True
+            )
+
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content_parts.append(delta.content)
+                    yield LLMStreamEvent(type="content", content=delta.content)
+
+                for tool_delta in delta.tool_calls or []:
+                    # Trailing deltas for a call already dispatched carry nothing new
+                    if tool_delta.index == finished_index:
+                        continue
+
+                    # A delta for a new index means the previous tool call is complete
+                    if current is not None and tool_delta.index != current["index"]:
+                        yield LLMStreamEvent(type="tool_call", tool_call=finish_tool_call(current))
+                        current = None
+
+                    if current is None:
+                        current = {
+                            "index": tool_delta.index,
+                            "id": "",
+                            "name": "",
+                            "arguments": IncrementalJsonParser()
+                        }
+
+                    if tool_delta.id:
+                        current["id"] = tool_delta.id
+                    if tool_delta.function:
+                        if tool_delta.function.name:
+                            current["name"] += tool_delta.function.name
+                        if tool_delta.function.arguments:
+                            current["arguments"].feed(tool_delta.function.arguments)
+
+                    # Dispatch as soon as the arguments object closes
+                    if current["id"] and current["name"] and current["arguments"].complete:
+                        yield LLMStreamEvent(type="tool_call", tool_call=finish_tool_call(current))
+                        finished_index = current["index"]
+                        current = None
+
+            if current is not None:
+                yield LLMStreamEvent(type="tool_call", tool_call=finish_tool_call(current))
+
+        except Exception as e:
+            yield LLMStreamEvent(type="content", content=f"I encountered an error: {str(e)}")
+            yield LLMStreamEvent(type="done")
+            return
+
+        if tool_calls:
+            llm_response = LLMResponse(content="", tool_calls=tool_calls)
+        else:
+            llm_response = LLMResponse(content="".join(content_parts), tool_calls=None)
+        if cache_key:
+            self.response_cache.set(cache_key, llm_response)
+
+        yield LLMStreamEvent(type="done")
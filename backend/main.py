@@ -1,19 +1,28 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Query
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, Request, Response, status, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 import uvicorn
 from dotenv import load_dotenv
+from functools import lru_cache
 import os
+import orjson
 from typing import Optional
+from pydantic import TypeAdapter
 
-from database import get_db, engine, Base
-from models import User, Product, Order, OrderItem, Review, ConversationSession, ConversationMessage
+from config import get_settings
+from database import get_db, engine, Base, upgrade_schema
+from models import (
+    User, Product, Order, OrderItem, Review, ConversationSession, ConversationMessage,
+    is_valid_session_id
+)
 from schemas import (
     UserCreate, UserResponse, ProductCreate, ProductResponse,
     OrderCreate, OrderResponse, ReviewCreate, ReviewResponse,
     LoginRequest, TokenResponse, AgentChatRequest, AgentChatResponse,
-    ChangePasswordRequest
+    ChangePasswordRequest, product_list_adapter, order_list_adapter, review_list_adapter
 )
 from auth import create_access_token, verify_token, get_password_hash, verify_password
 from services import ProductService, OrderService, ReviewService, EmailService
@@ -22,10 +31,16 @@ from agent_service import ShopAgent
 
 load_dotenv()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+app = FastAPI(title="E-commerce API", version="1.0.0", default_response_class=ORJSONResponse)
+
+
+@app.on_event("startup")
+def create_tables():
+    # Runs once the worker starts serving rather than on every import
+    if get_settings().db_create_tables_on_startup:
+        Base.metadata.create_all(bind=engine)
+        upgrade_schema(engine)
 
-app = FastAPI(title="E-commerce API", version="1.0.0")
 
 # CORS middleware
 app.add_middleware(
@@ -66,21 +81,25 @@ order_service = OrderService()
 review_service = ReviewService()
 email_service = EmailService()
 
-# Initialize AI services (lazy loading to handle missing API keys gracefully)
-pinecone_service = None
-shop_agent = None
-
+# Initialize AI services (lazy loading to handle missing API keys gracefully).
+# lru_cache does not cache exceptions, so a failed init is retried on the next call.
+@lru_cache(maxsize=1)
 def get_pinecone_service():
-    global pinecone_service
-    if pinecone_service is None:
-        pinecone_service = PineconeService()
-    return pinecone_service
+    return PineconeService()
 
+@lru_cache(maxsize=1)
 def get_shop_agent():
-    global shop_agent
-    if shop_agent is None:
-        shop_agent = ShopAgent(pinecone_service=get_pinecone_service())
-    return shop_agent
+    return ShopAgent(pinecone_service=get_pinecone_service())
+
+@app.on_event("shutdown")
+async def close_ai_services():
+    # Only close the agent if it was ever built
+    if get_shop_agent.cache_info().currsize:
+        await get_shop_agent().llm_service.aclose()
+
+@app.on_event("shutdown")
+async def close_email_service():
+    await email_service.aclose()
 
 # Authentication endpoints
 @app.post("/auth/register", response_model=UserResponse)
@@ -94,7 +113,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await run_in_threadpool(get_password_hash, user_data.password)
     db_user = User(
         email=user_data.email,
         hashed_password=hashed_password,
@@ -104,17 +123,12 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     db.commit()
     db.refresh(db_user)
     
-    return UserResponse(
-        id=db_user.id,
-        email=db_user.email,
-        full_name=db_user.full_name,
-        is_active=db_user.is_active
-    )
+    return UserResponse.model_validate(db_user)
 
 @app.post("/auth/login", response_model=TokenResponse)
 async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == login_data.email).first()
-    if not user or not verify_password(login_data.password, user.hashed_password):
+    if not user or not await run_in_threadpool(verify_password, login_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
@@ -126,12 +140,7 @@ async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
 @app.get("/auth/me", response_model=UserResponse)
 async def get_current_user_profile(current_user: User = Depends(get_current_user)):
     """Get current user's profile information."""
-    return UserResponse(
-        id=current_user.id,
-        email=current_user.email,
-        full_name=current_user.full_name,
-        is_active=current_user.is_active
-    )
+    return UserResponse.model_validate(current_user)
 
 @app.put("/auth/update-profile", response_model=UserResponse)
 async def update_user_profile(
@@ -155,17 +164,12 @@ async def update_user_profile(
 
     # Update password if provided
     if user_data.password:
-        current_user.hashed_password = get_password_hash(user_data.password)
+        current_user.hashed_password = await run_in_threadpool(get_password_hash, user_data.password)
 
     db.commit()
     db.refresh(current_user)
 
-    return UserResponse(
-        id=current_user.id,
-        email=current_user.email,
-        full_name=current_user.full_name,
-        is_active=current_user.is_active
-    )
+    return UserResponse.model_validate(current_user)
 
 @app.put("/auth/change-password")
 async def change_password(
@@ -175,30 +179,82 @@ async def change_password(
 ):
     """Change current user's password."""
     # Verify current password
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    if not await run_in_threadpool(verify_password, password_data.current_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
     
     # Update password
-    current_user.hashed_password = get_password_hash(password_data.new_password)
+    current_user.hashed_password = await run_in_threadpool(get_password_hash, password_data.new_password)
     db.commit()
     
     return {"message": "Password changed successfully"}
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header (a list, W/ validators or *) against etag."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def _cached_response(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Set caching headers and return a 304 response if the client's ETag matches."""
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={get_settings().product_cache_max_age}"
+    }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
+def _json_list_response(adapter: TypeAdapter, items: list, headers=None) -> Response:
+    """Serialize response models straight to JSON bytes with their pydantic adapter."""
+    # A returned Response skips FastAPI's re-validation and per-item dict trip;
+    # response_model on the route still documents the schema
+    return Response(content=adapter.dump_json(items), media_type="application/json", headers=headers)
+
 # Product endpoints
 @app.get("/products", response_model=list[ProductResponse])
 async def get_products(
-    skip: int = 0, 
+    request: Request,
+    response: Response,
+    last_id: int = Query(default=0, ge=0),
     limit: int = 100, 
     category: str = None,
+    skip: int = Query(default=0, ge=0, deprecated=True),
     db: Session = Depends(get_db)
 ):
-    return product_service.get_products(db, skip=skip, limit=limit, category=category)
+    # Keyset pagination: pass the id of the last product on the previous page.
+    # skip still works for older clients but pays for OFFSET on deep pages.
+    etag = product_service.get_products_etag(db, last_id=last_id, limit=limit, category=category, skip=skip)
+    not_modified = _cached_response(request, response, etag)
+    if not_modified:
+        return not_modified
+    products = product_service.get_products(db, last_id=last_id, limit=limit, category=category, skip=skip)
+    return _json_list_response(product_list_adapter, products, headers=dict(response.headers))
 
 @app.get("/products/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: int, db: Session = Depends(get_db)):
+async def get_product(
+    product_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    etag = product_service.get_product_etag(db, product_id)
+    if etag is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    not_modified = _cached_response(request, response, etag)
+    if not_modified:
+        return not_modified
     product = product_service.get_product(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -270,6 +326,39 @@ async def chat_with_agent(
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
 
+# Streaming agent chat endpoint
+@app.post("/chat/stream")
+async def stream_chat_with_agent(
+    request: AgentChatRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Chat with the AI shopping agent over server-sent events.
+    Streams token events as the reply is generated, then a done event
+    carrying the full AgentChatResponse.
+    """
+    try:
+        agent = get_shop_agent()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
+
+    async def event_stream():
+        try:
+            async for event in agent.stream_message(
+                message=request.message,
+                db=db,
+                session_id=request.session_id,
+                user_id=request.user_id
+            ):
+                if event["type"] == "done":
+                    event = {"type": "done", "response": event["response"].model_dump(mode="json")}
+                yield b"data: " + orjson.dumps(event) + b"\n\n"
+        except Exception as e:
+            yield b"data: " + orjson.dumps({"type": "error", "detail": f"Chat error: {str(e)}"}) + b"\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 # Authenticated chat endpoint
 @app.post("/chat/authenticated", response_model=AgentChatResponse)
 async def authenticated_chat(
@@ -315,32 +404,37 @@ async def get_product_recommendations(
 @app.get("/conversations/{session_id}")
 async def get_conversation(
     session_id: str,
+    skip: int = Query(default=0, ge=0),
+    limit: int = Query(default=200, ge=1, le=200),
     db: Session = Depends(get_db)
 ):
-    """Get conversation history for a session."""
-    session = db.query(ConversationSession).filter(
+    """Get conversation history for a session, oldest first, one page at a time."""
+    if not is_valid_session_id(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    # Both lookups select only the returned columns, so no ORM objects are hydrated
+    session = db.query(ConversationSession.id, ConversationSession.created_at).filter(
         ConversationSession.id == session_id
     ).first()
 
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    messages = db.query(ConversationMessage).filter(
+    messages = db.query(
+        ConversationMessage.role,
+        ConversationMessage.content,
+        ConversationMessage.intent,
+        ConversationMessage.created_at
+    ).filter(
         ConversationMessage.session_id == session_id
-    ).order_by(ConversationMessage.created_at).all()
+    ).order_by(ConversationMessage.created_at).offset(skip).limit(limit).all()
 
     return {
         "session_id": session.id,
         "created_at": session.created_at,
-        "messages": [
-            {
-                "role": m.role,
-                "content": m.content,
-                "intent": m.intent,
-                "created_at": m.created_at
-            }
-            for m in messages
-        ]
+        "skip": skip,
+        "limit": limit,
+        "messages": [m._asdict() for m in messages]
     }
 
 
@@ -362,13 +456,14 @@ async def index_products(
 @app.post("/orders", response_model=OrderResponse)
 async def create_order(
     order_data: OrderCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     order = order_service.create_order(db, order_data, current_user.id)
     
-    # Send email notification
-    await email_service.send_order_confirmation(current_user.email, order)
+    # Send email notification after the response, off the checkout path
+    background_tasks.add_task(email_service.send_order_confirmation, current_user.email, order)
     
     return order
 
@@ -377,7 +472,7 @@ async def get_user_orders(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    return order_service.get_user_orders(db, current_user.id)
+    return _json_list_response(order_list_adapter, order_service.get_user_orders(db, current_user.id))
 
 # Review endpoints
 @app.post("/reviews", response_model=ReviewResponse)
@@ -386,11 +481,17 @@ async def create_review(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    return review_service.create_review(db, review_data, current_user.id)
+    try:
+        review = review_service.create_review(db, review_data, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if review is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return review
 
 @app.get("/products/{product_id}/reviews", response_model=list[ReviewResponse])
 async def get_product_reviews(product_id: int, db: Session = Depends(get_db)):
-    return review_service.get_product_reviews(db, product_id)
+    return _json_list_response(review_list_adapter, review_service.get_product_reviews(db, product_id))
 
 # Wishlist endpoints
 @app.post("/wishlist/{product_id}")
@@ -414,7 +515,7 @@ async def get_wishlist(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    return await product_service.get_wishlist(db, current_user.id)
+    return _json_list_response(product_list_adapter, await product_service.get_wishlist(db, current_user.id))
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Table, Index, JSON, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -6,12 +7,27 @@ import uuid
 
 Base = declarative_base()
 
+# Session IDs are native 16-byte UUIDs on PostgreSQL and plain strings elsewhere
+SessionId = String().with_variant(UUID(as_uuid=False), "postgresql")
+
+
+def is_valid_session_id(value: str) -> bool:
+    """Return True if value is a well-formed session UUID."""
+    try:
+        uuid.UUID(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
 # Association table for many-to-many relationship between users and products (wishlist)
 wishlist_association = Table(
     'wishlist',
     Base.metadata,
     Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
-    Column('product_id', Integer, ForeignKey('products.id'), primary_key=True)
+    Column('product_id', Integer, ForeignKey('products.id'), primary_key=True),
+    # The (user_id, product_id) primary key already serves per-user lookups;
+    # this covers the reverse direction (Product.wishlist_users, product deletes)
+    Index('ix_wishlist_product_id', 'product_id')
 )
 
 class User(Base):
@@ -33,6 +49,10 @@ class User(Base):
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Serves keyset pagination of active products, optionally within a category
+        Index("ix_products_is_active_category_id", "is_active", "category", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -55,7 +75,7 @@ class Order(Base):
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     total_amount = Column(Float, nullable=False)
     status = Column(String, default="pending")  # pending, confirmed, shipped, delivered, cancelled
     shipping_address = Column(Text, nullable=False)
@@ -70,8 +90,8 @@ class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     quantity = Column(Integer, nullable=False)
     price = Column(Float, nullable=False)  # Price at time of order
 
@@ -81,10 +101,14 @@ class OrderItem(Base):
 
 class Review(Base):
     __tablename__ = "reviews"
+    __table_args__ = (
+        # One review per user and product, enforced by the database
+        UniqueConstraint("user_id", "product_id", name="uq_review_user_product"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     rating = Column(Integer, nullable=False)  # 1-5 stars
     comment = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -99,11 +123,13 @@ class ConversationSession(Base):
     """Track chat sessions for multi-turn conversations."""
     __tablename__ = "conversation_sessions"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(SessionId, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = Column(Boolean, default=True)
+    summary = Column(Text)  # LLM summary of messages older than summary_until
+    summary_until = Column(DateTime)  # created_at of the last summarized message
 
     # Relationships
     user = relationship("User", back_populates="conversation_sessions")
@@ -113,15 +139,19 @@ class ConversationSession(Base):
 class ConversationMessage(Base):
     """Store individual messages in a conversation."""
     __tablename__ = "conversation_messages"
+    __table_args__ = (
+        # Serves the per-session history lookup ordered by created_at
+        Index("ix_conversation_messages_session_id_created_at", "session_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String, ForeignKey("conversation_sessions.id"), nullable=False)
+    session_id = Column(SessionId, ForeignKey("conversation_sessions.id"), nullable=False)
     role = Column(String, nullable=False)  # "user", "assistant", "system", "tool"
     content = Column(Text, nullable=False)
     intent = Column(String)  # Classified intent
-    entities = Column(Text)  # JSON string of extracted entities
-    tool_calls = Column(Text)  # JSON string of tool calls made
-    tool_results = Column(Text)  # JSON string of tool results
+    entities = Column(JSON)  # Extracted entities
+    tool_calls = Column(JSON)  # Names of tool calls made
+    tool_results = Column(JSON)  # Tool results
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
@@ -1,12 +1,17 @@
 from pinecone import Pinecone, ServerlessSpec
-from sentence_transformers import SentenceTransformer
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 
+import numpy as np
+
+from cache_service import EmbeddingStore, LRUCache, SemanticCache
 from config import get_settings
+from embedding_service import embedding_model_id, get_sentence_transformer
 from models import Product
-from schemas import ProductResponse
+from schemas import ProductResponse, product_list_adapter
 
 
 class ProductMetadata(BaseModel):
@@ -18,6 +23,9 @@ class ProductMetadata(BaseModel):
     price: float = Field(..., description="Product price")
     stock_quantity: int = Field(..., description="Available stock")
     is_active: bool = Field(default=True, description="Product availability status")
+    description: str = Field(default="", description="Product description")
+    image_url: str = Field(default="", description="Product image URL")
+    created_at: str = Field(default="", description="Product creation time (ISO 8601)")
 
 
 class SearchResult(BaseModel):
@@ -44,13 +52,48 @@ class PineconeService:
         if not settings.pinecone_api_key:
             raise ValueError("PINECONE_API_KEY environment variable is not set")
 
-        self.pc = Pinecone(api_key=settings.pinecone_api_key)
+        if settings.pinecone_use_grpc:
+            # Optional dependency (pinecone-client[grpc]): vectors travel as packed
+            # protobuf floats instead of JSON number text
+            from pinecone.grpc import PineconeGRPC
+            self.pc = PineconeGRPC(api_key=settings.pinecone_api_key)
+        else:
+            self.pc = Pinecone(api_key=settings.pinecone_api_key)
         self.index_name = settings.pinecone_index_name
-        self.model = SentenceTransformer(settings.embedding_model)
+        if settings.use_static_embeddings:
+            # Optional dependency: token lookup + mean pooling, no transformer forward pass
+            from model2vec import StaticModel
+            self.model = StaticModel.from_pretrained(settings.static_embedding_model, normalize=True)
+            self.encode_batch_size = 1024
+        else:
+            self.model = get_sentence_transformer()
+            self.encode_batch_size = 1024 if self.model.device.type == "cuda" else 64
+        self.use_static_embeddings = settings.use_static_embeddings
+        self.embedding_store = None
+        if settings.embedding_store_path:
+            # Backend and ONNX file are part of the namespace since they change the vectors
+            model_name = settings.static_embedding_model if self.use_static_embeddings else embedding_model_id()
+            self.embedding_store = EmbeddingStore(
+                settings.embedding_store_path,
+                namespace=model_name,
+                quantize=settings.embedding_store_int8
+            )
+        # Encoding is CPU-bound; a small dedicated pool keeps it off the event loop
+        # without letting concurrent searches oversubscribe the CPU
+        self._embed_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="embed")
         self.dimension = settings.embedding_dimension
         self.cloud = settings.pinecone_cloud
         self.region = settings.pinecone_region
         self.default_min_score = settings.search_min_score
+        self.embedding_cache = LRUCache(maxsize=settings.embedding_cache_size)
+        # Pinecone matches of recent queries, reused for near-duplicate queries
+        self.search_cache = SemanticCache(
+            dimension=self.dimension,
+            threshold=settings.search_cache_threshold,
+            maxsize=settings.search_cache_size,
+            quantize=settings.search_cache_int8,
+            max_scopes=settings.search_cache_max_scopes
+        )
 
         self._initialize_index()
         self.index = self.pc.Index(self.index_name)
@@ -70,80 +113,228 @@ class PineconeService:
                 )
             )
 
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts into a matrix of normalized embeddings with the configured model."""
+        if self.use_static_embeddings:
+            return self.model.encode(texts, batch_size=self.encode_batch_size, show_progress_bar=False)
+        return self.model.encode(
+            texts,
+            batch_size=self.encode_batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+            normalize_embeddings=True
+        )
+
+    def _encode_cached(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode product texts, reusing embeddings persisted by earlier runs.
+
+        Fresh encodes are returned in their stored (possibly quantized) form,
+        so a text embeds identically whether or not the store was warm.
+        """
+        if self.embedding_store is None:
+            return self._encode(texts)
+
+        stored = self.embedding_store.get_many(texts)
+        missing = [i for i, embedding in enumerate(stored) if embedding is None]
+        if missing:
+            encoded = self._encode([texts[i] for i in missing])
+            encoded = self.embedding_store.set_many([texts[i] for i in missing], encoded)
+            for i, embedding in zip(missing, encoded):
+                stored[i] = embedding
+        return np.vstack(stored).astype(np.float32, copy=False)
+
+    @staticmethod
+    def _normalize_text(text: str) -> str:
+        """Normalize text into the key used by the embedding caches."""
+        return " ".join(text.lower().split())
+
+    def _cache_embeddings(self, keys: List[str], embeddings: Sequence[np.ndarray]) -> None:
+        """Memoize embeddings as shared, read-only arrays."""
+        for key, embedding in zip(keys, embeddings):
+            embedding.flags.writeable = False
+            self.embedding_cache.set(key, embedding)
+
+    def embed(self, text: str) -> np.ndarray:
+        """
+        Encode text into a normalized embedding vector.
+
+        Embeddings are memoized by normalized text, so repeated queries skip
+        the model. Query-time encodes stay in memory only and are never
+        written to the embedding store. The returned array is shared and
+        read-only.
+        """
+        key = self._normalize_text(text)
+        embedding = self.embedding_cache.get(key)
+        if embedding is None:
+            embedding = self._encode([key])[0]
+            self._cache_embeddings([key], [embedding])
+        return embedding
+
+    async def aembed(self, text: str) -> np.ndarray:
+        """Like embed, but runs the model in the embedding pool on a cache miss."""
+        key = self._normalize_text(text)
+        embedding = self.embedding_cache.get(key)
+        if embedding is None:
+            loop = asyncio.get_running_loop()
+            embedding = (await loop.run_in_executor(self._embed_pool, self._encode, [key]))[0]
+            self._cache_embeddings([key], [embedding])
+        return embedding
+
     def _product_to_text(self, product: Product) -> str:
         """Convert product to searchable text representation."""
-        parts = [
-            product.name,
-            product.description or "",
-            product.category,
-            product.brand or "",
-            f"price ${product.price}"
-        ]
-        return " ".join(filter(None, parts))
-
-    def _product_to_metadata(self, product: Product) -> ProductMetadata:
-        """Convert product to Pydantic metadata model."""
-        return ProductMetadata(
-            product_id=product.id,
-            name=product.name,
-            category=product.category,
-            brand=product.brand or "",
-            price=float(product.price),
-            stock_quantity=product.stock_quantity,
-            is_active=product.is_active
+        return " ".join([
+            part for part in (
+                product.name,
+                product.description,
+                product.category,
+                product.brand,
+                f"price ${product.price}"
+            ) if part
+        ])
+
+    def _product_to_metadata(self, product: Product) -> Dict[str, Any]:
+        """
+        Convert product to the metadata dict stored with its vector.
+
+        Fields follow ProductMetadata; a plain dict skips model validation
+        and model_dump for every indexed product.
+        """
+        return {
+            "product_id": product.id,
+            "name": product.name,
+            "category": product.category,
+            "brand": product.brand or "",
+            "price": float(product.price),
+            "stock_quantity": product.stock_quantity,
+            "is_active": product.is_active,
+            "description": product.description or "",
+            "image_url": product.image_url or "",
+            "created_at": product.created_at.isoformat() if product.created_at else ""
+        }
+
+    def _metadata_to_response(self, metadata: Optional[Dict[str, Any]]) -> Optional[ProductResponse]:
+        """
+        Build a ProductResponse from stored vector metadata.
+
+        Returns None when the metadata predates the denormalized fields, in
+        which case the caller loads the product from the database instead.
+        """
+        if not metadata or not metadata.get("created_at"):
+            return None
+
+        # Pinecone returns numbers as floats; ProductResponse coerces them back
+        return ProductResponse(
+            id=metadata["product_id"],
+            name=metadata["name"],
+            description=metadata.get("description") or None,
+            price=metadata["price"],
+            category=metadata["category"],
+            brand=metadata.get("brand") or None,
+            image_url=metadata.get("image_url") or None,
+            stock_quantity=metadata.get("stock_quantity", 0),
+            is_active=metadata.get("is_active", True),
+            created_at=metadata["created_at"]
         )
 
     async def index_product(self, product: Product) -> None:
         """Index a single product in Pinecone."""
-        text = self._product_to_text(product)
-        embedding = self.model.encode(text).tolist()
-        metadata = self._product_to_metadata(product)
-
-        self.index.upsert(
-            vectors=[{
-                "id": str(product.id),
-                "values": embedding,
-                "metadata": metadata.model_dump()
-            }]
-        )
+        await self.index_products([product])
 
-    async def index_all_products(self, db: Session, batch_size: int = 100) -> int:
-        """Index all active products from database to Pinecone."""
-        products = db.query(Product).filter(Product.is_active == True).all()
+    async def index_products(self, products: List[Product], batch_size: int = 100) -> int:
+        """
+        Index a list of products (or rows with the same columns) in Pinecone.
 
-        vectors = []
-        for product in products:
-            text = self._product_to_text(product)
-            embedding = self.model.encode(text).tolist()
-            metadata = self._product_to_metadata(product)
+        Texts already in the embedding store are reused; the rest are
+        encoded in one batched call, which lets the model group
+        similar-length texts together, then upserted in groups
+        of batch_size with up to 8 upserts in flight.
+        """
+        if not products:
+            return 0
+
+        texts = [self._product_to_text(product) for product in products]
+        loop = asyncio.get_running_loop()
+        embeddings = await loop.run_in_executor(self._embed_pool, self._encode_cached, texts)
+
+        batches = [
+            [
+                {
+                    "id": str(product.id),
+                    "values": embedding.tolist(),
+                    "metadata": self._product_to_metadata(product)
+                }
+                for product, embedding in zip(
+                    products[start:start + batch_size],
+                    embeddings[start:start + batch_size]
+                )
+            ]
+            for start in range(0, len(products), batch_size)
+        ]
 
-            vectors.append({
-                "id": str(product.id),
-                "values": embedding,
-                "metadata": metadata.model_dump()
-            })
+        # Keep several upserts in flight, capped to stay within Pinecone's rate limits
+        semaphore = asyncio.Semaphore(8)
 
-            if len(vectors) >= batch_size:
-                self.index.upsert(vectors=vectors)
-                vectors = []
+        async def upsert(vectors: List[Dict[str, Any]]) -> None:
+            async with semaphore:
+                await asyncio.to_thread(self.index.upsert, vectors=vectors)
 
-        if vectors:
-            self.index.upsert(vectors=vectors)
+        await asyncio.gather(*(upsert(vectors) for vectors in batches))
 
+        self.search_cache.clear()
         return len(products)
 
+    async def index_all_products(self, db: Session, batch_size: int = 100, chunk_size: int = 1000) -> int:
+        """
+        Index all active products from database to Pinecone.
+
+        Rows are streamed chunk_size at a time with only the indexed columns
+        selected, so memory stays flat and no ORM entities are built.
+        """
+        rows = db.query(
+            Product.id,
+            Product.name,
+            Product.description,
+            Product.category,
+            Product.brand,
+            Product.price,
+            Product.stock_quantity,
+            Product.is_active,
+            Product.image_url,
+            Product.created_at
+        ).filter(Product.is_active == True).yield_per(chunk_size)
+
+        total = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                total += await self.index_products(chunk, batch_size=batch_size)
+                chunk = []
+        if chunk:
+            total += await self.index_products(chunk, batch_size=batch_size)
+        return total
+
     async def delete_product(self, product_id: int) -> None:
         """Remove a product from Pinecone index."""
-        self.index.delete(ids=[str(product_id)])
+        await asyncio.to_thread(self.index.delete, ids=[str(product_id)])
+        self.search_cache.clear()
+
+    @staticmethod
+    def _price_in_range(price: float, min_price: Optional[float], max_price: Optional[float]) -> bool:
+        """Re-apply the price filter to a database price that may differ from the indexed one."""
+        return (min_price is None or price >= min_price) and (max_price is None or price <= max_price)
 
     def _build_filter(
         self,
         category_filter: Optional[str] = None,
         min_price: Optional[float] = None,
-        max_price: Optional[float] = None
-    ) -> Optional[Dict[str, Any]]:
+        max_price: Optional[float] = None,
+        exclude_product_id: Optional[int] = None
+    ) -> Dict[str, Any]:
         """Build Pinecone metadata filter from search parameters."""
-        filter_dict: Dict[str, Any] = {}
+        # Inactive products are dropped by Pinecone rather than after the query
+        filter_dict: Dict[str, Any] = {"is_active": {"$eq": True}}
 
         if category_filter:
             filter_dict["category"] = {"$eq": category_filter}
@@ -155,7 +346,10 @@ class PineconeService:
         elif max_price is not None:
             filter_dict["price"] = {"$lte": max_price}
 
-        return filter_dict if filter_dict else None
+        if exclude_product_id is not None:
+            filter_dict["product_id"] = {"$ne": exclude_product_id}
+
+        return filter_dict
 
     async def search(
         self,
@@ -165,11 +359,19 @@ class PineconeService:
         category_filter: Optional[str] = None,
         min_price: Optional[float] = None,
         max_price: Optional[float] = None,
-        min_score: Optional[float] = None
+        min_score: Optional[float] = None,
+        hydrate_from_db: bool = False,
+        exclude_product_id: Optional[int] = None
     ) -> List[SearchResult]:
         """
         Semantic search for products using Pinecone.
 
+        Products are built from the metadata stored with each vector, then
+        checked against the database in one narrow query: products that were
+        deactivated or deleted since indexing are dropped, and price and stock
+        come from the database. Pass hydrate_from_db=True to load every field
+        from the database instead.
+
         Args:
             query: Search query string
             db: Database session
@@ -178,6 +380,8 @@ class PineconeService:
             min_price: Minimum price filter
             max_price: Maximum price filter
             min_score: Minimum similarity score threshold
+            hydrate_from_db: Load products from the database instead of metadata
+            exclude_product_id: Product to leave out of the results
 
         Returns:
             List of SearchResult objects with products and similarity scores
@@ -186,37 +390,100 @@ class PineconeService:
             min_score = self.default_min_score
 
         # Generate query embedding
-        query_embedding = self.model.encode(query).tolist()
-
-        # Build metadata filter
-        filter_dict = self._build_filter(category_filter, min_price, max_price)
-
-        # Query Pinecone
-        query_params: Dict[str, Any] = {
-            "vector": query_embedding,
-            "top_k": top_k,
-            "include_metadata": True
-        }
-
-        if filter_dict:
-            query_params["filter"] = filter_dict
+        query_embedding = await self.aembed(query)
+
+        # Near-duplicate queries with the same parameters reuse earlier matches
+        scope = (top_k, category_filter, min_price, max_price, min_score, exclude_product_id)
+        matches = self.search_cache.get(query_embedding, scope)
+        if matches is None:
+            # Query Pinecone with the metadata filter applied server-side
+            results = await asyncio.to_thread(
+                self.index.query,
+                vector=query_embedding.tolist(),
+                top_k=top_k,
+                include_metadata=True,
+                filter=self._build_filter(category_filter, min_price, max_price, exclude_product_id)
+            )
+            matches = [
+                (int(match.id), match.score, match.metadata)
+                for match in results.matches
+                if match.score >= min_score
+            ]
+            self.search_cache.set(query_embedding, matches, scope)
+
+        # Build products from metadata, falling back to one database query for the rest
+        products: Dict[int, ProductResponse] = {}
+        missing_ids: List[int] = []
+        to_response = self._metadata_to_response
+        for product_id, _, metadata in matches:
+            product = None if hydrate_from_db else to_response(metadata)
+            if product is None:
+                missing_ids.append(product_id)
+            else:
+                products[product_id] = product
+
+        if products:
+            # Metadata is only as fresh as the last reindex; trust the database for
+            # whether a product is still active and for its price and stock
+            fresh = {
+                row.id: row
+                for row in db.query(Product.id, Product.price, Product.stock_quantity).filter(
+                    Product.id.in_(list(products)),
+                    Product.is_active == True
+                )
+            }
+            for product_id in list(products):
+                row = fresh.get(product_id)
+                if row is None or not self._price_in_range(row.price, min_price, max_price):
+                    del products[product_id]
+                else:
+                    products[product_id] = products[product_id].model_copy(
+                        update={"price": row.price, "stock_quantity": row.stock_quantity}
+                    )
+
+        if missing_ids:
+            rows = db.query(Product).filter(
+                Product.id.in_(missing_ids),
+                Product.is_active == True
+            ).all()
+            for product in product_list_adapter.validate_python(rows, from_attributes=True):
+                if self._price_in_range(product.price, min_price, max_price):
+                    products[product.id] = product
+
+        # Keep Pinecone's ranking order
+        search_results: List[SearchResult] = []
+        for product_id, score, _ in matches:
+            product = products.get(product_id)
+            if product:
+                search_results.append(SearchResult(
+                    product=product,
+                    similarity=round(score, 4)
+                ))
 
-        results = self.index.query(**query_params)
+        return search_results
 
-        # Format results with full product data from database
-        search_results: List[SearchResult] = []
-        for match in results.matches:
-            if match.score >= min_score:
-                product_id = int(match.id)
-                product = db.query(Product).filter(Product.id == product_id).first()
+    async def search_many(
+        self,
+        queries: List[str],
+        db: Session,
+        **search_kwargs: Any
+    ) -> List[List[SearchResult]]:
+        """
+        Run several searches with the same parameters.
 
-                if product and product.is_active:
-                    search_results.append(SearchResult(
-                        product=ProductResponse.model_validate(product),
-                        similarity=round(match.score, 4)
-                    ))
+        Queries missing from the embedding cache are encoded in one batched
+        call, then the Pinecone queries run concurrently.
+        """
+        keys = [self._normalize_text(query) for query in queries]
+        missing = [key for key in dict.fromkeys(keys) if self.embedding_cache.get(key) is None]
+        if missing:
+            loop = asyncio.get_running_loop()
+            embeddings = await loop.run_in_executor(self._embed_pool, self._encode, missing)
+            self._cache_embeddings(missing, embeddings)
 
-        return search_results
+        return list(await asyncio.gather(
+            *(self.search(query=query, db=db, **search_kwargs) for query in queries)
+        ))
 
     async def find_similar_products(
         self,
@@ -230,12 +497,10 @@ class PineconeService:
             return []
 
         text = self._product_to_text(product)
-        results = await self.search(
+        return await self.search(
             query=text,
             db=db,
-            top_k=top_k + 1,
-            min_score=0.2
+            top_k=top_k,
+            min_score=0.2,
+            exclude_product_id=product_id
         )
-
-        # Filter out the original product
-        return [r for r in results if r.product.id != product_id][:top_k]
@@ -6,8 +6,9 @@ This script creates sample products, users, and reviews for demonstration purpos
 
 import sys
 import os
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine
+from database import SessionLocal, engine, upgrade_schema
 from models import Base, User, Product, Review
 from auth import get_password_hash
 from datetime import datetime, timedelta
@@ -15,6 +16,7 @@ import random
 
 # Create all tables
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 
 def create_demo_data():
     """Create demo data for the e-commerce platform."""
@@ -43,9 +45,15 @@ def create_demo_data():
             }
         ]
         
+        # Look up every existing demo user in one query instead of one per email
+        existing_users = {
+            user.email: user
+            for user in db.query(User).filter(User.email.in_([u["email"] for u in demo_users])).all()
+        }
+        
         users = []
         for user_data in demo_users:
-            existing_user = db.query(User).filter(User.email == user_data["email"]).first()
+            existing_user = existing_users.get(user_data["email"])
             if not existing_user:
                 user = User(
                     email=user_data["email"],
@@ -174,9 +182,14 @@ def create_demo_data():
             }
         ]
         
+        existing_products = {
+            product.name: product
+            for product in db.query(Product).filter(Product.name.in_([p["name"] for p in demo_products])).all()
+        }
+        
         products = []
         for product_data in demo_products:
-            existing_product = db.query(Product).filter(Product.name == product_data["name"]).first()
+            existing_product = existing_products.get(product_data["name"])
             if not existing_product:
                 product = Product(**product_data)
                 db.add(product)
@@ -202,23 +215,31 @@ def create_demo_data():
             "Fantastic quality, exceeded my expectations."
         ]
         
-        reviews_created = 0
+        # Pairs reviewed by an earlier run; uq_review_user_product allows one review each
+        reviewed = set(db.query(Review.user_id, Review.product_id).filter(
+            Review.product_id.in_([product.id for product in products])
+        ).all())
+        
+        review_rows = []
         for product in products:
-            # Create 2-5 reviews per product
+            # Create 2-5 reviews per product, each from a different user
             num_reviews = random.randint(2, 5)
-            for _ in range(num_reviews):
-                user = random.choice(users)
-                review = Review(
-                    user_id=user.id,
-                    product_id=product.id,
-                    rating=random.randint(3, 5),  # Mostly positive reviews
-                    comment=random.choice(review_texts),
-                    created_at=datetime.utcnow() - timedelta(days=random.randint(1, 30))
-                )
-                db.add(review)
-                reviews_created += 1
+            for user in random.sample(users, k=min(num_reviews, len(users))):
+                if (user.id, product.id) in reviewed:
+                    continue
+                review_rows.append({
+                    "user_id": user.id,
+                    "product_id": product.id,
+                    "rating": random.randint(3, 5),  # Mostly positive reviews
+                    "comment": random.choice(review_texts),
+                    "created_at": datetime.utcnow() - timedelta(days=random.randint(1, 30))
+                })
         
+        # One executemany INSERT instead of tracking a Review object per row
+        if review_rows:
+            db.execute(insert(Review), review_rows)
         db.commit()
+        reviews_created = len(review_rows)
         print(f"✅ Created {reviews_created} reviews")
         
         print("\n🎉 Demo data creation completed successfully!")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr, TypeAdapter
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -15,8 +15,7 @@ class UserResponse(UserBase):
     id: int
     is_active: bool
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ChangePasswordRequest(BaseModel):
     current_password: str
@@ -40,8 +39,10 @@ class ProductResponse(ProductBase):
     is_active: bool
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+# Validates a whole list of ORM products in one call instead of one model_validate per row
+product_list_adapter = TypeAdapter(List[ProductResponse])
 
 # Order schemas
 class OrderItemCreate(BaseModel):
@@ -59,8 +60,7 @@ class OrderItemResponse(BaseModel):
     price: float
     product: ProductResponse
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class OrderResponse(BaseModel):
     id: int
@@ -71,8 +71,9 @@ class OrderResponse(BaseModel):
     created_at: datetime
     order_items: List[OrderItemResponse]
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+order_list_adapter = TypeAdapter(List[OrderResponse])
 
 # Review schemas
 class ReviewCreate(BaseModel):
@@ -89,8 +90,9 @@ class ReviewResponse(BaseModel):
     created_at: datetime
     user: UserResponse
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+review_list_adapter = TypeAdapter(List[ReviewResponse])
 
 # Authentication schemas
 class LoginRequest(BaseModel):
@@ -183,8 +185,7 @@ class ConversationMessageResponse(BaseModel):
     entities: Optional[Dict[str, Any]] = None
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ConversationSessionResponse(BaseModel):
@@ -194,8 +195,7 @@ class ConversationSessionResponse(BaseModel):
     is_active: bool
     messages: List[ConversationMessageResponse] = []
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Enhanced Agent Chat Request/Response
@@ -1,93 +1,179 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, exists, func, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, load_only, selectinload
 from typing import List, Optional
 from models import Product, Order, OrderItem, Review, User, wishlist_association
 from schemas import (
     ProductCreate, ProductResponse, OrderCreate, OrderResponse,
-    ReviewCreate, ReviewResponse
+    ReviewCreate, ReviewResponse, UserResponse,
+    order_list_adapter, review_list_adapter
 )
+import asyncio
 import os
+import string
 from dotenv import load_dotenv
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from sentence_transformers import SentenceTransformer
+import aiosmtplib
+from email.message import EmailMessage
+
+from cache_service import LRUCache, make_cache_key
+from config import get_settings
 
 load_dotenv()
 
+# Product columns exposed by ProductResponse, selected without building ORM objects
+PRODUCT_RESPONSE_COLUMNS = tuple(getattr(Product, name) for name in ProductResponse.model_fields)
+# Reviewer columns exposed by ReviewResponse.user; skips the password hash and timestamps
+USER_RESPONSE_COLUMNS = tuple(getattr(User, name) for name in UserResponse.model_fields)
+
+
+def _trusted_products(rows) -> List[ProductResponse]:
+    """Build ProductResponse objects from projected DB rows without re-validating them."""
+    return [ProductResponse.model_construct(**row._mapping) for row in rows]
+
+
 class ProductService:
     def __init__(self):
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-    
-    def get_products(self, db: Session, skip: int = 0, limit: int = 100, category: str = None):
-        """Get products with optional filtering."""
-        query = db.query(Product).filter(Product.is_active == True)
+        # category -> ETag version of the product list, briefly reused across requests
+        self.list_versions = LRUCache(maxsize=256, ttl=get_settings().product_version_ttl)
+
+    def get_products(
+        self,
+        db: Session,
+        last_id: int = 0,
+        limit: int = 100,
+        category: Optional[str] = None,
+        skip: int = 0
+    ):
+        """Get the page of products after last_id, with optional filtering.
+
+        skip is the deprecated OFFSET form, still honoured for older clients.
+        """
+        # Seek past last_id instead of OFFSET so deep pages cost the same as the first
+        query = db.query(*PRODUCT_RESPONSE_COLUMNS).filter(Product.is_active == True, Product.id > last_id)
         
         if category:
             query = query.filter(Product.category == category)
         
-        products = query.offset(skip).limit(limit).all()
-        return [ProductResponse.from_orm(product) for product in products]
+        query = query.order_by(Product.id)
+        if skip:
+            query = query.offset(skip)
+        return _trusted_products(query.limit(limit).all())
     
     def get_product(self, db: Session, product_id: int):
         """Get a single product by ID."""
         product = db.query(Product).filter(Product.id == product_id).first()
         if product:
-            return ProductResponse.from_orm(product)
+            return ProductResponse.model_validate(product)
         return None
     
+    def get_products_etag(
+        self,
+        db: Session,
+        last_id: int = 0,
+        limit: int = 100,
+        category: Optional[str] = None,
+        skip: int = 0
+    ) -> str:
+        """ETag for a product list page, derived from the latest update time and row count."""
+        version = self.list_versions.get(category)
+        if version is None:
+            query = db.query(func.max(Product.updated_at), func.count(Product.id)).filter(
+                Product.is_active == True
+            )
+            if category:
+                query = query.filter(Product.category == category)
+            version = tuple(query.one())
+            self.list_versions.set(category, version)
+        return f'"{make_cache_key("products", last_id, skip, limit, category, version)[:32]}"'
+
+    def get_product_etag(self, db: Session, product_id: int) -> Optional[str]:
+        """ETag for a single product, or None if it does not exist."""
+        # Selecting the id too tells a missing row apart from a NULL updated_at
+        row = db.query(Product.id, Product.updated_at).filter(Product.id == product_id).first()
+        if row is None:
+            return None
+        if row.updated_at is None:
+            return f'"{product_id}"'
+        return f'"{product_id}-{row.updated_at.isoformat()}"'
+
     def create_product(self, db: Session, product_data: ProductCreate):
         """Create a new product."""
-        db_product = Product(**product_data.dict())
+        db_product = Product(**product_data.model_dump())
         db.add(db_product)
         db.commit()
         db.refresh(db_product)
-        return ProductResponse.from_orm(db_product)
+        self.list_versions.clear()
+        return ProductResponse.model_validate(db_product)
     
+    def _product_exists(self, db: Session, product_id: int) -> bool:
+        return db.query(exists().where(Product.id == product_id)).scalar()
+
+    def _wishlist_has(self, db: Session, user_id: int, product_id: int) -> bool:
+        """Check wishlist membership with an EXISTS query on the association table."""
+        return db.query(exists().where(
+            wishlist_association.c.user_id == user_id,
+            wishlist_association.c.product_id == product_id
+        )).scalar()
+
     async def add_to_wishlist(self, db: Session, user_id: int, product_id: int):
         """Add a product to user's wishlist."""
-        user = db.query(User).filter(User.id == user_id).first()
-        product = db.query(Product).filter(Product.id == product_id).first()
-        
-        if not user or not product:
+        if not self._product_exists(db, product_id):
             return False
         
-        if product not in user.wishlist_products:
-            user.wishlist_products.append(product)
-            db.commit()
+        # Insert the association row directly; the wishlist collection is never loaded
+        if not self._wishlist_has(db, user_id, product_id):
+            try:
+                db.execute(insert(wishlist_association).values(user_id=user_id, product_id=product_id))
+                db.commit()
+            except IntegrityError:
+                db.rollback()  # Added by a concurrent request
         
         return True
     
     async def remove_from_wishlist(self, db: Session, user_id: int, product_id: int):
         """Remove a product from user's wishlist."""
-        user = db.query(User).filter(User.id == user_id).first()
-        product = db.query(Product).filter(Product.id == product_id).first()
-        
-        if not user or not product:
-            return False
-        
-        if product in user.wishlist_products:
-            user.wishlist_products.remove(product)
-            db.commit()
+        result = db.execute(delete(wishlist_association).where(
+            wishlist_association.c.user_id == user_id,
+            wishlist_association.c.product_id == product_id
+        ))
+        db.commit()
         
-        return True
+        # Nothing deleted is still a success unless the product does not exist
+        return result.rowcount > 0 or self._product_exists(db, product_id)
     
     async def get_wishlist(self, db: Session, user_id: int):
         """Get user's wishlist."""
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            return []
+        # Join through the association table directly instead of loading the user first
+        rows = db.query(*PRODUCT_RESPONSE_COLUMNS).join(
+            wishlist_association, wishlist_association.c.product_id == Product.id
+        ).filter(wishlist_association.c.user_id == user_id).all()
         
-        return [ProductResponse.from_orm(product) for product in user.wishlist_products]
+        return _trusted_products(rows)
 
 class OrderService:
+    @staticmethod
+    def _order_load_options():
+        """Eager-load what OrderResponse serializes: items and each item's product."""
+        return (
+            selectinload(Order.order_items).joinedload(OrderItem.product)
+            .load_only(*PRODUCT_RESPONSE_COLUMNS),
+        )
+
     def create_order(self, db: Session, order_data: OrderCreate, user_id: int):
         """Create a new order."""
+        # Load every ordered product in one query instead of one per item
+        product_ids = {item.product_id for item in order_data.items}
+        products = {
+            product.id: product
+            for product in db.query(Product).filter(Product.id.in_(product_ids)).all()
+        }
+        
         # Calculate total amount
         total_amount = 0
         order_items = []
         
         for item in order_data.items:
-            product = db.query(Product).filter(Product.id == item.product_id).first()
+            product = products.get(item.product_id)
             if not product:
                 raise ValueError(f"Product {item.product_id} not found")
             
@@ -95,46 +181,40 @@ class OrderService:
             total_amount += item_total
             
             order_items.append(OrderItem(
-                product_id=item.product_id,
+                product=product,
                 quantity=item.quantity,
                 price=product.price
             ))
         
-        # Create order
+        # Create the order with its items attached; the unit of work inserts the
+        # order, fills in order_id and batches the item INSERTs in one commit
         order = Order(
             user_id=user_id,
             total_amount=total_amount,
-            shipping_address=order_data.shipping_address
+            shipping_address=order_data.shipping_address,
+            order_items=order_items
         )
         db.add(order)
-        db.flush()  # Get the order ID
-        
-        # Add order items
-        for order_item in order_items:
-            order_item.order_id = order.id
-            db.add(order_item)
-        
         db.commit()
-        db.refresh(order)
+        order = db.query(Order).options(*self._order_load_options()).populate_existing().filter(
+            Order.id == order.id
+        ).one()
         
-        return OrderResponse.from_orm(order)
+        return OrderResponse.model_validate(order)
     
     def get_user_orders(self, db: Session, user_id: int):
         """Get all orders for a user."""
-        orders = db.query(Order).filter(Order.user_id == user_id).all()
-        return [OrderResponse.from_orm(order) for order in orders]
+        orders = db.query(Order).options(*self._order_load_options()).filter(
+            Order.user_id == user_id
+        ).all()
+        return order_list_adapter.validate_python(orders, from_attributes=True)
 
 class ReviewService:
     def create_review(self, db: Session, review_data: ReviewCreate, user_id: int):
-        """Create a new review."""
-        # Check if user has already reviewed this product
-        existing_review = db.query(Review).filter(
-            Review.user_id == user_id,
-            Review.product_id == review_data.product_id
-        ).first()
-        
-        if existing_review:
-            raise ValueError("You have already reviewed this product")
+        """Create a new review, or return None if the product does not exist."""
+        # Checked up front so a foreign-key failure is not reported as a duplicate review
+        if not db.query(exists().where(Product.id == review_data.product_id)).scalar():
+            return None
         
         review = Review(
             user_id=user_id,
@@ -143,15 +223,24 @@ class ReviewService:
             comment=review_data.comment
         )
         db.add(review)
-        db.commit()
+        try:
+            # uq_review_user_product rejects a second review from the same user
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise ValueError("You have already reviewed this product")
         db.refresh(review)
         
-        return ReviewResponse.from_orm(review)
+        return ReviewResponse.model_validate(review)
     
     def get_product_reviews(self, db: Session, product_id: int):
         """Get all reviews for a product."""
-        reviews = db.query(Review).filter(Review.product_id == product_id).all()
-        return [ReviewResponse.from_orm(review) for review in reviews]
+        reviews = db.query(Review).options(
+            joinedload(Review.user).load_only(*USER_RESPONSE_COLUMNS)
+        ).filter(
+            Review.product_id == product_id
+        ).all()
+        return review_list_adapter.validate_python(reviews, from_attributes=True)
 
 class EmailService:
     def __init__(self):
@@ -159,6 +248,58 @@ class EmailService:
         self.smtp_port = int(os.getenv("SMTP_PORT", "587"))
         self.email = os.getenv("EMAIL_USER")
         self.password = os.getenv("EMAIL_PASSWORD")
+        # One logged-in SMTP session reused across emails instead of a TLS handshake per send
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._lock = asyncio.Lock()
+        # Parsed once; each email only substitutes the order fields
+        self._body_template = string.Template(
+            "Thank you for your order!\n"
+            "\n"
+            "Order ID: $id\n"
+            "Total Amount: $$$total\n"
+            "Status: $status\n"
+            "\n"
+            "We'll send you another email when your order ships.\n"
+            "\n"
+            "Best regards,\n"
+            "Your E-commerce Store\n"
+        )
+    
+    async def _connect(self) -> aiosmtplib.SMTP:
+        server = aiosmtplib.SMTP(hostname=self.smtp_server, port=self.smtp_port, start_tls=True)
+        await server.connect()
+        await server.login(self.email, self.password)
+        return server
+    
+    async def _get_server(self) -> aiosmtplib.SMTP:
+        """Return the open SMTP session, reconnecting if the server dropped it."""
+        if self._smtp is not None:
+            try:
+                await self._smtp.noop()
+                return self._smtp
+            except aiosmtplib.SMTPException:
+                await self.aclose()
+        self._smtp = await self._connect()
+        return self._smtp
+    
+    async def _send(self, msg):
+        async with self._lock:
+            try:
+                await (await self._get_server()).send_message(msg)
+            except aiosmtplib.SMTPServerDisconnected:
+                # Dropped between the health check and the send; retry once on a fresh session
+                await self.aclose()
+                await (await self._get_server()).send_message(msg)
+    
+    async def aclose(self):
+        """Quit the cached SMTP session, if any."""
+        if self._smtp is None:
+            return
+        try:
+            await self._smtp.quit()
+        except aiosmtplib.SMTPException:
+            pass
+        self._smtp = None
     
     async def send_order_confirmation(self, user_email: str, order: Order):
         """Send order confirmation email."""
@@ -167,32 +308,15 @@ class EmailService:
             return
         
         try:
-            msg = MIMEMultipart()
+            msg = EmailMessage()
             msg['From'] = self.email
             msg['To'] = user_email
             msg['Subject'] = f"Order Confirmation #{order.id}"
+            msg.set_content(self._body_template.substitute(
+                id=order.id, total=order.total_amount, status=order.status
+            ))
             
-            body = f"""
-            Thank you for your order!
-            
-            Order ID: {order.id}
-            Total Amount: ${order.total_amount}
-            Status: {order.status}
-            
-            We'll send you another email when your order ships.
-            
-            Best regards,
-            Your E-commerce Store
-            """
-            
-            msg.attach(MIMEText(body, 'plain'))
-            
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.email, self.password)
-            text = msg.as_string()
-            server.sendmail(self.email, user_email, text)
-            server.quit()
+            await self._send(msg)
             
         except Exception as e:
             print(f"Failed to send email: {str(e)}")